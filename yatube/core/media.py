@@ -0,0 +1,72 @@
+import os
+import re
+import string
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+HEX_DIGITS = set(string.hexdigits)
+
+
+class RangeFile:
+    """
+    Отдаёт из открытого файла только запрошенный диапазон байт.
+    fileno() оставлен, чтобы wsgi.file_wrapper мог отправить
+    файл через sendfile с текущей позиции.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Разбирает заголовок Range с одним диапазоном.
+    Возвращает (start, end) включительно, None, если заголовок
+    не поддерживается, и ValueError для недостижимого диапазона.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-500 - последние 500 байт файла.
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def is_content_hashed(path):
+    """
+    Проверяет, что имя файла - хэш его содержимого, разложенный
+    по подкаталогам (posts/ab/cd/abcd....jpg, cache/ab/cd/abcd....jpg).
+    Такие файлы никогда не меняются и кэшируются навсегда.
+    """
+    parts = path.split('/')
+    if len(parts) < 3:
+        return False
+    stem = os.path.splitext(parts[-1])[0].split('@')[0]
+    return (len(stem) >= 32 and set(stem) <= HEX_DIGITS
+            and parts[-3] == stem[:2] and parts[-2] == stem[2:4])
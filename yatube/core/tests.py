@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+
+from django.conf import settings
+from django.test import Client, TestCase, override_settings
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CONTENT = bytes(range(256)) * 4
+HASHED_NAME = 'cache/ab/cd/abcd' + '0' * 28 + '.jpg'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaServeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in ('posts/plain.jpg', HASHED_NAME):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_full_file(self):
+        """Файл отдаётся целиком с валидаторами кэша"""
+        response = self.client.get('/media/posts/plain.jpg')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_range_request(self):
+        """Запрос Range возвращает только нужные байты"""
+        response = self.client.get(
+            '/media/posts/plain.jpg', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, HTTPStatus.PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[10:20])
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 10-19/{len(CONTENT)}')
+        response = self.client.get(
+            '/media/posts/plain.jpg', HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[-5:])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(
+            '/media/posts/plain.jpg', HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code,
+                         HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304"""
+        etag = self.client.get('/media/posts/plain.jpg')['ETag']
+        response = self.client.get(
+            '/media/posts/plain.jpg', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_hashed_file_is_immutable(self):
+        response = self.client.get('/media/' + HASHED_NAME)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_missing_and_outside_files(self):
+        for url in ('/media/posts/none.jpg', '/media/../settings.py',
+                    '/media/posts/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(MEDIA_OFFLOAD_HEADER='X-Accel-Redirect')
+    def test_offload_header(self):
+        """В режиме выгрузки тело отдаёт фронтовой сервер"""
+        response = self.client.get('/media/posts/plain.jpg')
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/posts/plain.jpg')
+        self.assertEqual(response.content, b'')
@@ -1,4 +1,19 @@
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from .media import RangeFile, is_content_hashed, parse_range
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
 
 
 def page_not_found(request, exception):
@@ -15,3 +30,70 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Отдаёт файлы из MEDIA_ROOT: с поддержкой Range и условных запросов,
+    через wsgi.file_wrapper или заголовком для фронтового сервера.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Файл не найден')
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        raise Http404('Файл не найден')
+    if not os.path.isfile(fullpath):
+        raise Http404('Файл не найден')
+
+    etag = quote_etag('%x-%x' % (int(stat.st_mtime), stat.st_size))
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = media_response(request, path, fullpath, stat, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = (
+        IMMUTABLE_CACHE_CONTROL if is_content_hashed(path)
+        else f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}')
+    return response
+
+
+def media_response(request, path, fullpath, stat, etag):
+    content_type = (mimetypes.guess_type(path)[0]
+                    or 'application/octet-stream')
+    if settings.MEDIA_OFFLOAD_HEADER:
+        # Байты отдаёт фронтовой сервер, он же обрабатывает Range.
+        response = HttpResponse(content_type=content_type)
+        response[settings.MEDIA_OFFLOAD_HEADER] = posixpath.join(
+            settings.MEDIA_OFFLOAD_PREFIX, path)
+        return response
+
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if 'HTTP_RANGE' in request.META and if_range in (
+            None, etag, http_date(stat.st_mtime)):
+        try:
+            byte_range = parse_range(request.META['HTTP_RANGE'], stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    file = open(fullpath, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(
+            RangeFile(file, start, end - start + 1),
+            status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    response.block_size = settings.MEDIA_BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -5,11 +5,32 @@ from .models import Post, Group, Comment
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     list_editable = ('group',)
-    search_fields = ('text',)
+    # Сжатые тексты поиск по вхождению не видит, их начало - в excerpt.
+    search_fields = ('text', 'excerpt')
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_queryset(self, request):
+        # Полный текст нужен только на странице записи.
+        return super().get_queryset(request).for_list()
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # Список групп один на все строки list_editable.
+            if not hasattr(request, 'group_choices'):
+                request.group_choices = list(field.choices)
+            field.choices = request.group_choices
+        return field
+
+    def get_list_display(self, request):
+        # Колонка text ищется сначала среди полей модели и загрузила бы
+        # отложенный текст для каждой строки, показываем начало текста.
+        return tuple('excerpt' if name == 'text' else name
+                     for name in super().get_list_display(request))
+
 
 admin.site.register(Group)
 admin.site.register(Comment)
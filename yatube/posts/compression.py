@@ -0,0 +1,54 @@
+import zlib
+
+from django.conf import settings
+from django.db import models
+
+# Сжатый текст хранится байтами: первый байт - способ сжатия, дальше
+# сами данные. Короткие и плохо сжимаемые тексты лежат строкой как
+# есть, так что в одном столбце встречаются оба вида и читаются оба.
+# Столбец остаётся текстовым: SQLite хранит в нём байты как BLOB,
+# поэтому включение и выключение сжатия обходится без миграции схемы.
+# Поиск по вхождению и точное сравнение в SQL видят только несжатые
+# тексты.
+ZLIB = 1
+DECODERS = {
+    ZLIB: zlib.decompress,
+}
+
+
+def encode(text, level=None):
+    """Сжатые байты с заголовком или сам текст, если сжимать не стоит."""
+    data = text.encode()
+    if len(data) < settings.POST_TEXT_COMPRESS_MIN_SIZE:
+        return text
+    packed = zlib.compress(
+        data, level or settings.POST_TEXT_COMPRESS_LEVEL)
+    if len(packed) + 1 >= len(data):
+        return text
+    return bytes([ZLIB]) + packed
+
+
+def decode(value):
+    """Текст из значения столбца в любом из видов хранения."""
+    if isinstance(value, memoryview):
+        value = bytes(value)
+    if not isinstance(value, bytes):
+        return value
+    return DECODERS[value[0]](value[1:]).decode()
+
+
+def stored_size(value):
+    """Размер значения столбца в байтах."""
+    return len(value) if isinstance(value, bytes) else len(value.encode())
+
+
+def column_value(text):
+    """
+    Что писать в столбец: при POST_TEXT_COMPRESSION длинный текст
+    уходит выражением со сжатыми байтами, иначе пишется как есть.
+    """
+    if settings.POST_TEXT_COMPRESSION:
+        value = encode(text)
+        if isinstance(value, bytes):
+            return models.Value(value, output_field=models.BinaryField())
+    return text
@@ -0,0 +1,13 @@
+from functools import partial
+
+from posts.unread import unread_count
+
+
+def unread(request):
+    """
+    Добавляет число новых записей в ленте подписок. Считается лениво,
+    только если шаблон его выводит.
+    """
+    return {
+        'feed_unread': partial(unread_count, request.user),
+    }
@@ -0,0 +1,10 @@
+from functools import partial
+
+from posts.notifications import unread_count
+
+
+def unread(request):
+    """Добавляет число непрочитанных уведомлений, тоже лениво."""
+    return {
+        'notifications_unread': partial(unread_count, request.user),
+    }
@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Post
+
+# Просмотры копятся в памяти процесса, затем в общем кэше по
+# поколениям: счётчик записи и список id записей поколения в слотах.
+# Сброс переключает поколение и переносит в БД то, что было
+# отставлено прошлым сбросом, так что у запоздавших записей в кэш
+# есть целый интервал.
+GENERATION_KEY = 'views:generation'
+PENDING_KEY = 'views:{}:pending:{}'
+LENGTH_KEY = 'views:{}:length'
+SLOT_KEY = 'views:{}:slot:{}'
+FLUSH_LOCK_KEY = 'views:flush-lock'
+# Сколько записей обновлять одним запросом.
+UPDATE_CHUNK_SIZE = 500
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def _add(key, value):
+    """Атомарно прибавляет к числу в кэше и возвращает новое значение."""
+    if cache.add(key, value, settings.VIEW_CACHE_TIMEOUT):
+        return value
+    try:
+        return cache.incr(key, value)
+    except ValueError:
+        # Ключ успел истечь между add и incr.
+        cache.set(key, value, settings.VIEW_CACHE_TIMEOUT)
+        return value
+
+
+class ViewCounter:
+    """
+    Буфер просмотров процесса. Раз в VIEW_PUSH_SIZE просмотров или
+    VIEW_PUSH_INTERVAL секунд переносит их в общий кэш, так что при
+    падении процесса теряется не больше одной такой порции.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.total = 0
+        self.first_hit = None
+
+    def hit(self, post_id):
+        with self.lock:
+            self.pending[post_id] += 1
+            self.total += 1
+            if self.first_hit is None:
+                self.first_hit = time.monotonic()
+            due = self.total >= settings.VIEW_PUSH_SIZE or (
+                time.monotonic() - self.first_hit
+                >= settings.VIEW_PUSH_INTERVAL)
+        if due:
+            self.push()
+
+    def push(self):
+        with self.lock:
+            pending = self.pending
+            self.pending = Counter()
+            self.total = 0
+            self.first_hit = None
+        if not pending:
+            return
+        generation = _generation()
+        for post_id, count in pending.items():
+            if _add(PENDING_KEY.format(generation, post_id),
+                    count) == count:
+                # Первые просмотры записи в поколении: заносим её в список.
+                slot = _add(LENGTH_KEY.format(generation), 1)
+                cache.set(SLOT_KEY.format(generation, slot), post_id,
+                          settings.VIEW_CACHE_TIMEOUT)
+        # Сбрасывать в БД будет тот процесс, что первым займёт интервал.
+        if cache.add(FLUSH_LOCK_KEY, 1, settings.VIEW_FLUSH_INTERVAL):
+            flush_views()
+
+    def get(self, post_id):
+        with self.lock:
+            return self.pending[post_id]
+
+
+view_counter = ViewCounter()
+
+
+def _flush_generation(generation):
+    """
+    Переносит просмотры поколения в БД запросами
+    UPDATE ... SET views = views + n, по одному на каждое n.
+    """
+    length = cache.get(LENGTH_KEY.format(generation), 0)
+    slots = [SLOT_KEY.format(generation, slot)
+             for slot in range(1, length + 1)]
+    post_ids = set(cache.get_many(slots).values())
+    pending_keys = {PENDING_KEY.format(generation, post_id): post_id
+                    for post_id in post_ids}
+    by_count = defaultdict(list)
+    for key, count in cache.get_many(list(pending_keys)).items():
+        by_count[count].append(pending_keys[key])
+    with transaction.atomic():
+        for count, ids in by_count.items():
+            for start in range(0, len(ids), UPDATE_CHUNK_SIZE):
+                Post.objects.filter(
+                    id__in=ids[start:start + UPDATE_CHUNK_SIZE]).update(
+                    views=F('views') + count)
+    # Ключи удаляются после записи: при сбое между ними просмотры
+    # поколения могут учесться дважды, но не пропадут.
+    cache.delete_many(slots + list(pending_keys)
+                      + [LENGTH_KEY.format(generation)])
+    return len(post_ids)
+
+
+def flush_views(drain=False):
+    """
+    Переключает поколение и переносит в БД предыдущее, отставленное
+    прошлым сбросом: процесс, прочитавший номер поколения перед самым
+    переключением, мог ещё дописывать в него. С drain после паузы
+    VIEW_FLUSH_GRACE переносится и только что отставленное.
+    Возвращает число обновлённых записей.
+    """
+    generation = _generation()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, generation + 1, None)
+    flushed = _flush_generation(generation - 1)
+    if drain:
+        time.sleep(settings.VIEW_FLUSH_GRACE)
+        flushed += _flush_generation(generation)
+    return flushed
+
+
+def views_of(post):
+    """Просмотры записи с ещё не сброшенными, без запросов к БД."""
+    generation = _generation()
+    shared = cache.get_many([PENDING_KEY.format(generation, post.id),
+                             PENDING_KEY.format(generation - 1, post.id)])
+    return post.views + sum(shared.values()) + view_counter.get(post.id)
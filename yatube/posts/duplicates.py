@@ -0,0 +1,119 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import SignatureBand
+
+# MinHash текста: NUM_HASHES минимумов хэшей его шинглов. Доля
+# совпавших минимумов у двух текстов оценивает долю общих шинглов.
+# Минимумы разбиты на полосы по BAND_ROWS, полоса целиком хэшируется
+# в ключ: у похожих текстов совпадает много ключей, у разных - почти
+# ни одного, так что кандидатов ищем по индексу ключей.
+NUM_HASHES = 64
+BAND_ROWS = 4
+BANDS = NUM_HASHES // BAND_ROWS
+# Шинглы - пары слов подряд.
+SHINGLE_WORDS = 2
+WORD_RE = re.compile(r'\w+')
+MASK = (1 << 64) - 1
+
+
+def _seed(name, index):
+    return int.from_bytes(hashlib.blake2b(
+        f'{name}:{index}'.encode(), digest_size=8).digest(), 'little')
+
+
+# Хэши семейства multiply-shift: (a * x + b) mod 2**64, старшие 32 бита.
+MULTIPLIERS = [_seed('a', i) | 1 for i in range(NUM_HASHES)]
+INCREMENTS = [_seed('b', i) for i in range(NUM_HASHES)]
+
+
+def shingles(text):
+    words = WORD_RE.findall(text.lower())
+    if len(words) < settings.DUPLICATE_MIN_WORDS:
+        return set()
+    return {' '.join(words[i:i + SHINGLE_WORDS])
+            for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def shingle_hash(shingle):
+    return int.from_bytes(
+        hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'little')
+
+
+def minhash(text):
+    """Подпись текста, None для слишком коротких текстов."""
+    hashes = [shingle_hash(shingle) for shingle in shingles(text)]
+    if not hashes:
+        return None
+    return [min(((a * x + b) & MASK) >> 32 for x in hashes)
+            for a, b in zip(MULTIPLIERS, INCREMENTS)]
+
+
+def minhash_many(texts):
+    """
+    То же для пачки текстов: хэши всех шинглов пачки считаются
+    одной матрицей numpy, минимумы - по отрезкам каждого текста.
+    """
+    import numpy as np
+
+    hashes, owners = [], []
+    for index, text in enumerate(texts):
+        for shingle in shingles(text):
+            hashes.append(shingle_hash(shingle))
+            owners.append(index)
+    result = [None] * len(texts)
+    if not hashes:
+        return result
+    values = (np.array(hashes, dtype=np.uint64)[:, None]
+              * np.array(MULTIPLIERS, dtype=np.uint64)
+              + np.array(INCREMENTS, dtype=np.uint64)) >> np.uint64(32)
+    owners = np.array(owners)
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    signatures = np.minimum.reduceat(values, starts, axis=0)
+    for index, signature in zip(owners[starts], signatures.tolist()):
+        result[index] = signature
+    return result
+
+
+def band_keys(signature):
+    """Ключи полос подписи, по одному 64-битному числу со знаком."""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]
+        data = band.to_bytes(1, 'little') + b''.join(
+            value.to_bytes(4, 'little') for value in rows)
+        keys.append(int.from_bytes(hashlib.blake2b(
+            data, digest_size=8).digest(), 'little', signed=True))
+    return keys
+
+
+def make_bands(post_id, signature):
+    return [SignatureBand(post_id=post_id, key=key)
+            for key in band_keys(signature)]
+
+
+def index_post(post):
+    """Переписывает полосы записи по её тексту."""
+    SignatureBand.objects.filter(post_id=post.id).delete()
+    signature = minhash(post.text)
+    if signature is not None:
+        SignatureBand.objects.bulk_create(make_bands(post.id, signature))
+
+
+def find_duplicate(text, exclude=None):
+    """
+    Id самой новой записи, совпавшей с текстом хотя бы в
+    DUPLICATE_MIN_BANDS полосах, или None. Один запрос по индексу.
+    """
+    signature = minhash(text)
+    if signature is None:
+        return None
+    bands = SignatureBand.objects.filter(key__in=band_keys(signature))
+    if exclude is not None:
+        bands = bands.exclude(post_id=exclude)
+    return bands.values('post_id').annotate(matched=Count('id')).filter(
+        matched__gte=settings.DUPLICATE_MIN_BANDS).order_by(
+        '-post_id').values_list('post_id', flat=True).first()
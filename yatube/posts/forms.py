@@ -1,4 +1,5 @@
 from django import forms
+from .duplicates import find_duplicate
 from .models import Post, Comment
 
 
@@ -8,6 +9,13 @@ class PostForm(forms.ModelForm):
         fields = ('text', 'group', 'image',)
         help_text = {'text': 'Любой текст', 'group': 'Из уже существующих'}
 
+    def clean_text(self):
+        text = self.cleaned_data['text']
+        if find_duplicate(text, exclude=self.instance.pk):
+            raise forms.ValidationError(
+                'Почти такая же запись уже опубликована')
+        return text
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
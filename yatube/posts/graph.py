@@ -0,0 +1,128 @@
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .models import Follow, Mute, SuggestionRefresh
+
+# Граф подписок в общем кэше: для каждого пользователя отсортированные
+# массивы id авторов, на которых он подписан, и id его подписчиков.
+# В ключ входит версия пользователя: изменение подписки её повышает,
+# так что массив, записанный читателем по данным до изменения, уже
+# никто не прочитает.
+FOLLOWING_KEY = 'follow:following:{}:{}'
+FOLLOWERS_KEY = 'follow:followers:{}:{}'
+# Скрытые пользователем авторы, обычно пустой массив.
+MUTED_KEY = 'follow:muted:{}:{}'
+VERSION_KEY = 'follow:version:{}'
+# Четыре байта на id.
+TYPECODE = 'I'
+
+
+def cache_version(key):
+    """Текущая версия из кэша, при первом обращении - от времени."""
+    version = cache.get(key)
+    if version is None:
+        # Версия от времени не повторит прежние, если ключ вытеснили.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def bump_versions(keys):
+    """Повышает версии, старые ключи с ними больше не читаются."""
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+def _load(template, user_id, queryset, column):
+    key = template.format(
+        user_id, cache_version(VERSION_KEY.format(user_id)))
+    data = cache.get(key)
+    ids = array(TYPECODE)
+    if data is not None:
+        ids.frombytes(data)
+        return ids
+    ids.extend(queryset.order_by(column).values_list(column, flat=True))
+    # Внутри транзакции данные могут откатиться, в общий кэш их не кладём.
+    if not connection.in_atomic_block:
+        cache.set(key, ids.tobytes(), settings.FOLLOW_GRAPH_TIMEOUT)
+    return ids
+
+
+def following(user_id):
+    """Отсортированные id авторов, на которых подписан пользователь."""
+    return _load(FOLLOWING_KEY, user_id,
+                 Follow.objects.filter(user_id=user_id), 'author_id')
+
+
+def followers(author_id):
+    """Отсортированные id подписчиков автора."""
+    return _load(FOLLOWERS_KEY, author_id,
+                 Follow.objects.filter(author_id=author_id), 'user_id')
+
+
+def muted(user_id):
+    """Отсортированные id авторов, скрытых пользователем."""
+    if user_id is None:
+        return array(TYPECODE)
+    return _load(MUTED_KEY, user_id,
+                 Mute.objects.filter(user_id=user_id), 'author_id')
+
+
+def contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def is_following(user_id, author_id):
+    if user_id is None:
+        return False
+    return contains(following(user_id), author_id)
+
+
+def followers_count(author_id):
+    return len(followers(author_id))
+
+
+def following_count(user_id):
+    return len(following(user_id))
+
+
+def edge_changed(user_id, author_id):
+    """
+    Повышает версии обоих концов подписки после коммита и ставит
+    пользователя в очередь на пересчёт рекомендаций. Массивы не
+    правятся на месте: два одновременных изменения через get и set
+    потеряли бы одно из них.
+    """
+    transaction.on_commit(lambda: bump_versions(
+        [VERSION_KEY.format(user_id), VERSION_KEY.format(author_id)]))
+    SuggestionRefresh.objects.bulk_create(
+        [SuggestionRefresh(user_id=user_id)], ignore_conflicts=True)
+
+
+def mute_changed(user_id, author_id):
+    transaction.on_commit(
+        lambda: bump_versions([VERSION_KEY.format(user_id)]))
+
+
+def invalidate(user_ids):
+    """Сбрасывает массивы пользователей после массовых изменений."""
+    bump_versions([VERSION_KEY.format(user_id) for user_id in user_ids])
+
+
+def follow(user_id, author_id):
+    """
+    Подписывает, если подписки ещё нет, и возвращает True для новой.
+    От повтора защищает уникальность пары, а не кэш графа.
+    """
+    _, created = Follow.objects.get_or_create(
+        user_id=user_id, author_id=author_id)
+    return created
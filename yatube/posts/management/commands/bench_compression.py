@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.compression import decode, encode, stored_size
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Замеряет на последних записях, насколько сжатие уменьшает '
+            'тексты и их HTML и сколько стоят сжатие и распаковка.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=1000)
+        parser.add_argument('--levels', type=int, nargs='+',
+                            default=[1, settings.POST_TEXT_COMPRESS_LEVEL, 9])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        rows = Post.objects.order_by('-id').values_list(
+            *Post.packed_fields)[:options['limit']]
+        # Сжимаются и текст, и его HTML: обе копии лежат в строке записи.
+        texts = [decode(value) for row in rows for value in row]
+        if not texts:
+            self.stdout.write('Записей нет.')
+            return
+        size = sum(len(text.encode()) for text in texts)
+        html_size = sum(len(text.encode()) for text in texts[1::2])
+        self.stdout.write(
+            f'Записей: {len(texts) // 2}, текст и HTML: {size} байт, '
+            f'из них HTML: {html_size}, сжимаются значения от '
+            f'{settings.POST_TEXT_COMPRESS_MIN_SIZE} байт')
+        for level in options['levels']:
+            encoded = [encode(text, level) for text in texts]
+            stored = sum(stored_size(value) for value in encoded)
+            packed = sum(isinstance(value, bytes) for value in encoded)
+            encode_time = self.measure(
+                lambda: [encode(text, level) for text in texts],
+                options['repeat'])
+            decode_time = self.measure(
+                lambda: [decode(value) for value in encoded],
+                options['repeat'])
+            self.stdout.write(
+                f'Уровень {level}: {stored} байт ({stored / size:.1%}), '
+                f'сжато значений: {packed}, '
+                f'сжатие {size / encode_time / 2 ** 20:.1f} МБ/с, '
+                f'распаковка {size / decode_time / 2 ** 20:.1f} МБ/с')
+
+    def measure(self, run, repeat):
+        """Лучшее время из нескольких прогонов, в секундах."""
+        best = None
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return max(best, 1e-9)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.placeholders import make_placeholder
+
+
+class Command(BaseCommand):
+    help = 'Считает превью-заглушки для картинок уже опубликованных постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать и уже заполненные превью.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only('id', 'image')
+        if not options['all']:
+            posts = posts.filter(placeholder='')
+        batch = []
+        done = 0
+        for post in posts.order_by('id').iterator(
+                chunk_size=options['batch_size']):
+            post.placeholder_color, post.placeholder = make_placeholder(
+                post.image)
+            post.image.close()
+            batch.append(post)
+            if len(batch) >= options['batch_size']:
+                done += self.flush(batch)
+                batch = []
+        done += self.flush(batch)
+        self.stdout.write(self.style.SUCCESS(f'Обработано постов: {done}'))
+
+    def flush(self, batch):
+        Post.objects.bulk_update(batch, ['placeholder_color', 'placeholder'])
+        return len(batch)
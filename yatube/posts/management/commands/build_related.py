@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import RelatedPost, RelatedRefresh
+from posts.related import TextMatrix, nearest
+
+
+class Command(BaseCommand):
+    help = ('Считает похожие записи по TF-IDF для новых и изменённых '
+            'записей и их соседей (нужен numpy).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать похожие для всех записей.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--top-k', type=int,
+                            default=settings.RELATED_TOP_K)
+        parser.add_argument('--max-df', type=int, default=10000,
+                            help='Не учитывать слова, которые есть в '
+                                 'большем числе записей.')
+
+    def handle(self, *args, **options):
+        matrix = TextMatrix.load()
+        max_df = options['max_df']
+        if options['all']:
+            post_ids = matrix.ids.tolist()
+        else:
+            post_ids = list(RelatedRefresh.objects.order_by(
+                'post_id').values_list('post_id', flat=True))
+        neighbours = set()
+        if not options['all']:
+            # Записи, у которых изменённые были в списке похожих, тоже
+            # пересчитываются: после правки ссылка могла устареть.
+            size = options['chunk_size']
+            for start in range(0, len(post_ids), size):
+                neighbours.update(RelatedPost.objects.filter(
+                    related_id__in=post_ids[start:start + size]
+                ).values_list('post_id', flat=True))
+        created = self.build_all(matrix, post_ids, max_df, options,
+                                 neighbours)
+        if not options['all']:
+            # Новые записи должны попасть и в списки своих соседей.
+            neighbours.difference_update(post_ids)
+            created += self.build_all(matrix, sorted(neighbours), max_df,
+                                      options, set())
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей: {len(post_ids) + len(neighbours)}, '
+            f'похожих: {created}'))
+
+    def build_all(self, matrix, post_ids, max_df, options, neighbours):
+        size = options['chunk_size']
+        created = 0
+        for start in range(0, len(post_ids), size):
+            created += self.build(matrix, post_ids[start:start + size],
+                                  max_df, options, neighbours)
+        return created
+
+    def build(self, matrix, post_ids, max_df, options, neighbours):
+        rows = matrix.index_of(post_ids)
+        present = rows >= 0
+        owners, docs, scores = nearest(
+            matrix, rows[present], options['top_k'], max_df)
+        good = scores >= settings.RELATED_MIN_SCORE
+        owner_ids = matrix.ids[rows[present]][owners[good]].tolist()
+        related_ids = matrix.ids[docs[good]].tolist()
+        neighbours.update(related_ids)
+        links = [
+            RelatedPost(post_id=post_id, related_id=related_id, score=score)
+            for post_id, related_id, score in zip(
+                owner_ids, related_ids, scores[good].tolist())
+        ]
+        with transaction.atomic():
+            RelatedPost.objects.filter(post_id__in=post_ids).delete()
+            RelatedPost.objects.bulk_create(links)
+            RelatedRefresh.objects.filter(post_id__in=post_ids).delete()
+        return len(links)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from posts.duplicates import make_bands, minhash_many
+from posts.models import Post, SignatureBand
+
+
+class Command(BaseCommand):
+    help = ('Считает подписи MinHash уже опубликованных записей '
+            'пачками (нужен numpy).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.filter(
+            signature_bands__isnull=True).only('id', 'text')
+        batch = []
+        done = 0
+        for post in posts.order_by('id').iterator(
+                chunk_size=options['batch_size']):
+            batch.append(post)
+            if len(batch) >= options['batch_size']:
+                done += self.flush(batch)
+                batch = []
+        done += self.flush(batch)
+        self.stdout.write(self.style.SUCCESS(f'Обработано постов: {done}'))
+
+    def flush(self, batch):
+        bands = []
+        for post, signature in zip(batch, minhash_many(
+                [post.text for post in batch])):
+            if signature is not None:
+                bands.extend(make_bands(post.id, signature))
+        SignatureBand.objects.bulk_create(bands, ignore_conflicts=True)
+        return len(batch)
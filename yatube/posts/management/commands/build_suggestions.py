@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import FollowSuggestion, SuggestionRefresh
+from posts.suggestions import FollowMatrix, top_candidates
+
+
+class Command(BaseCommand):
+    help = ('Считает рекомендации «кого почитать» по совместным подпискам '
+            'для пользователей, чьи подписки изменились.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать рекомендации для всех.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--top-k', type=int,
+                            default=settings.SUGGESTIONS_TOP_K)
+        parser.add_argument('--max-fanout', type=int, default=10000,
+                            help='Не учитывать авторов с большим числом '
+                                 'подписчиков.')
+
+    def handle(self, *args, **options):
+        size = options['chunk_size']
+        # Отметки забираются до загрузки матрицы: подписки, изменившиеся
+        # позже, оставят новые отметки до следующего запуска.
+        with transaction.atomic():
+            marked = list(SuggestionRefresh.objects.order_by(
+                'user_id').values_list('user_id', flat=True))
+            for start in range(0, len(marked), size):
+                SuggestionRefresh.objects.filter(
+                    user_id__in=marked[start:start + size]).delete()
+        try:
+            matrix = FollowMatrix.load()
+            if options['all']:
+                has_follows = matrix.indptr[1:] > matrix.indptr[:-1]
+                user_ids = matrix.ids[has_follows].tolist()
+            else:
+                user_ids = marked
+            created = 0
+            for start in range(0, len(user_ids), size):
+                created += self.build(
+                    matrix, user_ids[start:start + size], options)
+        except BaseException:
+            # Пересчёт не удался, отметки вернутся к следующему запуску.
+            SuggestionRefresh.objects.bulk_create(
+                [SuggestionRefresh(user_id=user_id) for user_id in marked],
+                ignore_conflicts=True)
+            raise
+        if options['all']:
+            # Рекомендации тех, кто отписался от всех, больше не нужны.
+            FollowSuggestion.objects.filter(
+                user__follower__isnull=True).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(user_ids)}, рекомендаций: {created}'))
+
+    def build(self, matrix, user_ids, options):
+        rows = matrix.index_of(user_ids)
+        present = rows >= 0
+        owners, candidates, scores = top_candidates(
+            matrix, rows[present], options['top_k'], options['max_fanout'])
+        owner_ids = [user_ids[i] for i in present.nonzero()[0]]
+        author_ids = matrix.ids[candidates].tolist()
+        suggestions = [
+            FollowSuggestion(user_id=owner_ids[owner], author_id=author_id,
+                             score=score)
+            for owner, author_id, score in zip(
+                owners.tolist(), author_ids, scores.tolist())
+        ]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=user_ids).delete()
+            FollowSuggestion.objects.bulk_create(suggestions)
+        return len(suggestions)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинги активных записей и групп за час и '
+            'за сутки и удаляет устаревшие счётчики.')
+
+    def handle(self, *args, **options):
+        trending.build()
+        self.stdout.write(self.style.SUCCESS('Рейтинги обновлены'))
@@ -0,0 +1,85 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import MediaFile, Post
+from posts.storage import UPLOAD_DIR, media_storage, walk_files
+
+
+def thumbnails_size(image_file):
+    """Суммарный размер миниатюр картинки по записям kvstore sorl."""
+    # У kvstore нет публичного метода для списка миниатюр источника.
+    keys = default.kvstore._get(image_file.key, identity='thumbnails') or []
+    size = 0
+    for key in keys:
+        thumbnail = default.kvstore._get(key)
+        if thumbnail and thumbnail.exists():
+            size += default.storage.size(thumbnail.name)
+    return size
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки, на которые не ссылается ни один пост, '
+            'их миниатюры и устаревшие записи kvstore sorl.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольки секунд: '
+                 'пост с ними может быть ещё не сохранён.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.min_age = options['min_age']
+        self.orphans = self.reclaimed = 0
+        root = media_storage.path(UPLOAD_DIR)
+        deadline = time.time() - options['min_age']
+        batch = {}
+        if os.path.isdir(root):
+            for entry in walk_files(root):
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime > deadline:
+                    continue
+                name = os.path.relpath(
+                    entry.path, media_storage.location).replace(os.sep, '/')
+                batch[name] = stat.st_size
+                if len(batch) >= options['batch_size']:
+                    self.collect(batch)
+                    batch = {}
+        self.collect(batch)
+        if not self.dry_run:
+            default.kvstore.cleanup()
+        verb = 'Будет освобождено' if self.dry_run else 'Освобождено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов без ссылок: {self.orphans}. '
+            f'{verb} байт: {self.reclaimed}'))
+
+    def collect(self, batch):
+        if not batch:
+            return
+        referenced = set(Post.objects.filter(image__in=list(batch))
+                         .order_by().values_list('image', flat=True))
+        orphans = []
+        for name in batch:
+            if name in referenced:
+                continue
+            image_file = ImageFile(name, media_storage)
+            if self.dry_run:
+                self.stdout.write(f'{name} ({batch[name]} байт)')
+            elif (media_storage.used_since(name, self.min_age)
+                  or Post.objects.filter(image=name).exists()):
+                # Пока шла пачка, файл загрузили повторно.
+                continue
+            self.reclaimed += batch[name] + thumbnails_size(image_file)
+            if not self.dry_run:
+                delete_thumbnails(image_file)
+            orphans.append(name)
+        if orphans and not self.dry_run:
+            MediaFile.objects.filter(name__in=orphans).delete()
+        self.orphans += len(orphans)
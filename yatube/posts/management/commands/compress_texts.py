@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.compression import column_value, decode, stored_size
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Переписывает тексты и HTML записей пачками по id в вид '
+            'хранения по текущим настройкам: при POST_TEXT_COMPRESSION '
+            'сжимает длинные, без него распаковывает.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        fields = list(Post.packed_fields)
+        last = 0
+        seen = changed = before = after = 0
+        while True:
+            with transaction.atomic():
+                # values_list минует Post.from_db: значения - как в столбце.
+                rows = list(Post.objects.filter(id__gt=last).order_by(
+                    'id').values_list('id', *fields)[:options['chunk_size']])
+                if not rows:
+                    break
+                batch = []
+                for pk, *stored in rows:
+                    values, dirty = {}, False
+                    for name, old in zip(fields, stored):
+                        value = column_value(decode(old))
+                        new = value if isinstance(value, str) else value.value
+                        before += stored_size(old)
+                        after += stored_size(new)
+                        dirty = dirty or new != old
+                        values[name] = value
+                    if dirty:
+                        batch.append(Post(id=pk, **values))
+                Post.objects.bulk_update(batch, fields)
+            last = rows[-1][0]
+            seen += len(rows)
+            changed += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей: {seen}, переписано: {changed}, '
+            f'текст и HTML занимали {before} байт, теперь {after}'))
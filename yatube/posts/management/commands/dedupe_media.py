@@ -0,0 +1,90 @@
+import os
+import shutil
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Case, Count, Value, When
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import MediaFile, Post
+from posts.storage import file_digest, hashed_name, is_hashed_name
+from posts.storage import UPLOAD_DIR, media_storage, walk_files
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов в хранилище с адресацией '
+            'по содержимому и удаляет дубликаты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        root = media_storage.path(UPLOAD_DIR)
+        self.moved = self.duplicates = self.saved = 0
+        batch = []
+        if os.path.isdir(root):
+            for entry in walk_files(root):
+                name = os.path.relpath(
+                    entry.path, media_storage.location).replace(os.sep, '/')
+                if is_hashed_name(name) or name.endswith('.part'):
+                    continue
+                batch.append(self.plan(entry, name))
+                if len(batch) >= options['batch_size']:
+                    self.apply(batch)
+                    batch = []
+        self.apply(batch)
+        if not self.dry_run:
+            self.rebuild_refs(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено: {self.moved}, дубликатов: {self.duplicates}, '
+            f'освобождено байт: {self.saved}'))
+
+    def plan(self, entry, name):
+        with open(entry.path, 'rb') as f:
+            digest = file_digest(File(f))
+        target = hashed_name(UPLOAD_DIR, digest, os.path.splitext(name)[1])
+        size = entry.stat(follow_symlinks=False).st_size
+        if media_storage.exists(target):
+            self.duplicates += 1
+            self.saved += size
+        elif not self.dry_run:
+            # Жёсткая ссылка: пока ссылки в БД не обновлены,
+            # старое имя продолжает работать.
+            target_path = media_storage.path(target)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            try:
+                os.link(entry.path, target_path)
+            except OSError:
+                shutil.copy2(entry.path, target_path)
+            self.moved += 1
+        else:
+            self.moved += 1
+        return name, target
+
+    def apply(self, batch):
+        if not batch or self.dry_run:
+            return
+        with transaction.atomic():
+            Post.objects.filter(image__in=[old for old, _ in batch]).update(
+                image=Case(
+                    *[When(image=old, then=Value(new)) for old, new in batch],
+                    output_field=models.CharField()))
+        for old, _ in batch:
+            delete_thumbnails(ImageFile(old, media_storage))
+
+    def rebuild_refs(self, batch_size):
+        counts = (Post.objects.exclude(image='').order_by()
+                  .values_list('image').annotate(refs=Count('id')))
+        with transaction.atomic():
+            MediaFile.objects.all().delete()
+            objs = []
+            for name, refs in counts.iterator():
+                objs.append(MediaFile(name=name, refs=refs))
+                if len(objs) >= batch_size:
+                    MediaFile.objects.bulk_create(objs)
+                    objs = []
+            MediaFile.objects.bulk_create(objs)
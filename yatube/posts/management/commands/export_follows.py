@@ -0,0 +1,43 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Follow
+
+
+class Command(BaseCommand):
+    help = 'Выгружает подписки в CSV или JSONL, не держа их в памяти.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            default='csv')
+        parser.add_argument('--usernames', action='store_true',
+                            help='Писать имена пользователей, а не id.')
+        parser.add_argument('--output', help='Файл, по умолчанию stdout.')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['usernames']:
+            keys = ('user', 'author')
+            fields = ('user__username', 'author__username')
+        else:
+            keys = fields = ('user_id', 'author_id')
+        edges = Follow.objects.order_by('id').values_list(*fields).iterator(
+            chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='',
+                      encoding='utf-8') as f:
+                self.dump(f, edges, keys, options['format'])
+        else:
+            self.dump(self.stdout, edges, keys, options['format'])
+
+    def dump(self, stream, edges, keys, fmt):
+        if fmt == 'csv':
+            writer = csv.writer(stream)
+            writer.writerow(keys)
+            writer.writerows(edges)
+        else:
+            for edge in edges:
+                stream.write(json.dumps(dict(zip(keys, edge)),
+                                        ensure_ascii=False) + '\n')
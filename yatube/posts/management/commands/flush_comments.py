@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.queues import flush_comments
+
+
+class Command(BaseCommand):
+    help = ('Записывает в БД комментарии из очереди, в том числе '
+            'пачки, брошенные упавшими процессами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-after', type=int, default=60,
+            help='Через сколько секунд пачка считается брошенной.')
+
+    def handle(self, *args, **options):
+        flushed = flush_comments(stale_after=options['stale_after'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано комментариев: {flushed}'))
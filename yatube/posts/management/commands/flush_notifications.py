@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.notifications import flush_notifications
+
+
+class Command(BaseCommand):
+    help = ('Записывает в БД уведомления из очереди, в том числе '
+            'пачки, брошенные упавшими процессами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-after', type=int, default=60,
+            help='Через сколько секунд пачка считается брошенной.')
+
+    def handle(self, *args, **options):
+        written = flush_notifications(stale_after=options['stale_after'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано уведомлений: {written}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import flush_views
+
+
+class Command(BaseCommand):
+    help = ('Переносит накопленные в кэше просмотры постов в БД. '
+            'Нужна, когда сайт затих и сброс не запускают просмотры.')
+
+    def handle(self, *args, **options):
+        flushed = flush_views(drain=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено постов: {flushed}'))
@@ -0,0 +1,108 @@
+import csv
+import itertools
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import graph
+from posts.models import Follow, SuggestionRefresh, User
+
+
+class Command(BaseCommand):
+    help = ('Загружает подписки из CSV или JSONL с полями user_id и '
+            'author_id (с --usernames - user и author).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdin.')
+        parser.add_argument('--format', choices=('csv', 'jsonl'))
+        parser.add_argument('--usernames', action='store_true',
+                            help='В файле имена пользователей, а не id.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--batches-per-transaction', type=int,
+                            default=10)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or (
+            'jsonl' if options['path'].endswith('.jsonl') else 'csv')
+        self.usernames = options['usernames']
+        self.processed = self.skipped = 0
+        if options['path'] == '-':
+            self.load(sys.stdin, fmt, options)
+        else:
+            with open(options['path'], newline='', encoding='utf-8') as f:
+                self.load(f, fmt, options)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано: {self.processed}, пропущено: {self.skipped}'))
+
+    def load(self, stream, fmt, options):
+        keys = ('user', 'author') if self.usernames else (
+            'user_id', 'author_id')
+        self.line = 0
+        try:
+            edges = self.edges(stream, fmt, keys)
+            batches = iter(lambda: list(
+                itertools.islice(edges, options['batch_size'])), [])
+            while True:
+                group = list(itertools.islice(
+                    batches, options['batches_per_transaction']))
+                if not group:
+                    break
+                self.insert(group)
+        except (KeyError, TypeError, ValueError) as error:
+            raise CommandError(f'Ошибка в строке {self.line}: {error!r}')
+
+    def edges(self, stream, fmt, keys):
+        """Пары из файла, в self.line - номер строки текущей записи."""
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for record in reader:
+                self.line = reader.line_num
+                yield self.edge(record, keys)
+        else:
+            for number, line in enumerate(stream, 1):
+                self.line = number
+                if line.strip():
+                    yield self.edge(json.loads(line), keys)
+
+    def edge(self, record, keys):
+        user, author = record[keys[0]], record[keys[1]]
+        if self.usernames:
+            return user, author
+        return int(user), int(author)
+
+    def insert(self, group):
+        touched = set()
+        with transaction.atomic():
+            for batch in group:
+                follows = self.resolve(batch)
+                Follow.objects.bulk_create(follows, ignore_conflicts=True)
+                SuggestionRefresh.objects.bulk_create(
+                    [SuggestionRefresh(user_id=user_id) for user_id in
+                     {follow.user_id for follow in follows}],
+                    ignore_conflicts=True)
+                for follow in follows:
+                    touched.update((follow.user_id, follow.author_id))
+                self.processed += len(batch)
+                self.skipped += len(batch) - len(follows)
+        # Массивы графа подписок перечитаются из БД при следующем запросе.
+        graph.invalidate(touched)
+        self.stdout.write(f'Обработано: {self.processed}')
+
+    def resolve(self, batch):
+        """Переводит пары в подписки, отбрасывая неизвестных и себя."""
+        if self.usernames:
+            users = dict(User.objects.filter(
+                username__in={name for pair in batch for name in pair}
+            ).values_list('username', 'id'))
+        else:
+            ids = set(User.objects.filter(
+                id__in={pk for pair in batch for pk in pair}
+            ).values_list('id', flat=True))
+            users = {pk: pk for pk in ids}
+        return [
+            Follow(user_id=users[user], author_id=users[author])
+            for user, author in batch
+            if user in users and author in users and user != author
+        ]
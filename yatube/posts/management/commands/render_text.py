@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from posts.compression import column_value
+from posts.markup import render_many
+from posts.models import Comment, Post
+from posts.tags import index_comments, index_post
+
+
+class Command(BaseCommand):
+    help = ('Перерисовывает HTML и выдержки уже опубликованных записей '
+            'и комментариев и обновляет индексы упоминаний и тегов. '
+            'После изменения правил разметки запускайте с --all.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--all', action='store_true',
+                            help='Перерисовать и уже готовые тексты.')
+
+    def handle(self, *args, **options):
+        done = 0
+        for model, fields in ((Post, ['id', 'text', 'author_id',
+                                      'pub_date']),
+                              (Comment, ['id', 'text', 'author_id',
+                                         'post_id', 'token'])):
+            items = model.objects.only(*fields)
+            if not options['all']:
+                items = items.filter(text_html='')
+            batch = []
+            for item in items.order_by('id').iterator(
+                    chunk_size=options['batch_size']):
+                batch.append(item)
+                if len(batch) >= options['batch_size']:
+                    done += self.flush(model, batch)
+                    batch = []
+            done += self.flush(model, batch)
+        self.stdout.write(self.style.SUCCESS(f'Обработано текстов: {done}'))
+
+    def flush(self, model, batch):
+        # Имена из всей пачки разрешаются одним запросом.
+        render_many(batch)
+        rows = batch
+        if model is Post:
+            # HTML записи пишется в том виде, в каком его хранит Post.save.
+            rows = [Post(id=post.id, text_html=column_value(post.text_html),
+                         excerpt=post.excerpt) for post in batch]
+        model.objects.bulk_update(rows, ['text_html', 'excerpt'])
+        if model is Post:
+            for post in batch:
+                index_post(post)
+        else:
+            index_comments(batch)
+        return len(batch)
@@ -0,0 +1,126 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
+
+# Разметка текстов записей и комментариев. Текст экранируется целиком,
+# теги в HTML появляются только из правил ниже, так что результат
+# безопасен без отдельной очистки. Правила меняются - тексты
+# перерисовывает команда render_text --all.
+#
+# Абзацы разделяются пустой строкой, перенос строки внутри абзаца -
+# <br>. Внутри строки: ссылки http(s), `код`, **жирный**, *курсив*,
+# упоминания @username (имена как в django.contrib.auth, без точки
+# в конце) и теги #слово. Перед упоминанием и тегом не должно быть
+# букв, чтобы адреса почты не разбирались.
+PARAGRAPH_RE = re.compile(r'\n[ \t]*\n\s*')
+INLINE_RE = re.compile(
+    r'(?P<url>https?://[^\s<>"\'`]*[^\s<>"\'`.,;:!?)\]*])'
+    r'|`(?P<code>[^`\n]+)`'
+    r'|\*\*(?P<bold>[^*\s](?:[^*\n]*[^*\s])?)\*\*'
+    r'|\*(?P<italic>[^*\s](?:[^*\n]*[^*\s])?)\*'
+    r'|(?<![\w@#&])(?:@(?P<mention>[\w+-]+(?:\.[\w+-]+)*)|#(?P<tag>\w+))')
+MAX_TAG_LENGTH = 50
+# Длина выдержки для карточек и превью, в символах.
+EXCERPT_LENGTH = 300
+SPACE_RE = re.compile(r'\s+')
+FORMAT_RE = re.compile(r'\*\*|`')
+
+
+def parse(text):
+    """Упоминания и теги текста по порядку, без повторов."""
+    mentions, tags = {}, {}
+
+    def collect(text):
+        for match in INLINE_RE.finditer(text):
+            if match.group('bold') or match.group('italic'):
+                collect(match.group('bold') or match.group('italic'))
+            elif match.group('mention'):
+                mentions[match.group('mention')] = None
+            elif (match.group('tag')
+                  and len(match.group('tag')) <= MAX_TAG_LENGTH):
+                tags[match.group('tag').lower()] = None
+
+    collect(text)
+    return list(mentions), list(tags)
+
+
+def resolve(names):
+    """Id пользователей по именам одним запросом IN."""
+    if not names:
+        return {}
+    return dict(get_user_model().objects.filter(
+        username__in=names).values_list('username', 'id'))
+
+
+def render_inline(text, users):
+    parts = []
+    last = 0
+    for match in INLINE_RE.finditer(text):
+        url, code, bold, italic, name, tag = match.group(
+            'url', 'code', 'bold', 'italic', 'mention', 'tag')
+        if url:
+            html = format_html('<a href="{}" rel="nofollow">{}</a>', url, url)
+        elif code:
+            html = format_html('<code>{}</code>', code)
+        elif bold:
+            html = format_html('<strong>{}</strong>',
+                               mark_safe(render_inline(bold, users)))
+        elif italic:
+            html = format_html('<em>{}</em>',
+                               mark_safe(render_inline(italic, users)))
+        elif name:
+            if name not in users:
+                continue
+            html = format_html(
+                '<a href="{}">@{}</a>',
+                reverse('posts:profile', args=[name]), name)
+        elif len(tag) <= MAX_TAG_LENGTH:
+            html = format_html(
+                '<a href="{}">#{}</a>',
+                reverse('posts:tag_posts', args=[tag.lower()]), tag)
+        else:
+            continue
+        parts.append(escape(text[last:match.start()]))
+        parts.append(html)
+        last = match.end()
+    parts.append(escape(text[last:]))
+    return ''.join(parts)
+
+
+def to_html(text, users):
+    """HTML текста: абзацы, переносы строк и разметка внутри строк."""
+    paragraphs = PARAGRAPH_RE.split(text.replace('\r\n', '\n').strip())
+    return ''.join(
+        '<p>' + '<br>'.join(render_inline(line, users)
+                            for line in paragraph.split('\n')) + '</p>'
+        for paragraph in paragraphs if paragraph)
+
+
+def to_excerpt(text):
+    """Начало текста одной строкой без разметки, по границе слова."""
+    text = SPACE_RE.sub(' ', FORMAT_RE.sub('', text)).strip()
+    if len(text) <= EXCERPT_LENGTH:
+        return text
+    cut = text[:EXCERPT_LENGTH - 1]
+    if ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip('.,;:!?') + '…'
+
+
+def render_many(instances):
+    """
+    Готовит text_html и excerpt записей или комментариев, разрешая
+    имена из всех текстов одним запросом. Id упомянутых пользователей
+    и теги остаются в атрибутах mentioned_ids и tag_names для индекса.
+    """
+    parsed = [parse(instance.text) for instance in instances]
+    users = resolve({name for mentions, _ in parsed for name in mentions})
+    for instance, (mentions, tags) in zip(instances, parsed):
+        instance.text_html = to_html(instance.text, users)
+        instance.excerpt = to_excerpt(instance.text)
+        instance.mentioned_ids = [users[name] for name in mentions
+                                  if name in users]
+        instance.tag_names = tags
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_auto_20220613_0046'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Имя файла')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ['-created']},
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to=settings.AUTH_USER_MODEL, verbose_name='Автор комментария'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='posts.Post', verbose_name='Пост комментария'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='text',
+            field=models.TextField(help_text='Текст нового комментария', verbose_name='Текст комментария'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.HashedMediaStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='follow',
+            unique_together={('user', 'author')},
+        ),
+    ]
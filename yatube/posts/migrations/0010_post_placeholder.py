@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_mediafile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Превью картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='placeholder_color',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Основной цвет картинки'),
+        ),
+    ]
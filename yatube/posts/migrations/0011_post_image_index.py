@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:47
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_placeholder'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, storage=posts.storage.HashedMediaStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_image_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created', '-id'], name='comment_post_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_comment_post_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='token',
+            field=models.UUIDField(editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:57
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+from posts.threads import MAX_STAMP, RANDOM_DIGITS, STAMP_DIGITS, to_base36
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def fill_paths(apps, schema_editor):
+    """Существующие комментарии становятся корнями веток."""
+    Comment = apps.get_model('posts', 'Comment')
+    comments = Comment.objects.only('id', 'created').order_by('id')
+    batch = []
+    for comment in comments.iterator():
+        created = comment.created
+        if timezone.is_naive(created):
+            created = timezone.make_aware(created, timezone.utc)
+        stamp = (created - EPOCH) // timedelta(microseconds=1)
+        # Хвост из id вместо случайного, чтобы пути не совпали.
+        comment.path = (to_base36(MAX_STAMP - stamp, STAMP_DIGITS)
+                        + to_base36(comment.id, RANDOM_DIGITS))
+        batch.append(comment)
+        if len(batch) >= 500:
+            Comment.objects.bulk_update(batch, ['path'])
+            batch = []
+    Comment.objects.bulk_update(batch, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_comment_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на комментарий'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='replies_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ответов в ветке'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='comment',
+            constraint=models.UniqueConstraint(fields=('post', 'path'), name='comment_post_path_uniq'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'user'], name='follow_author_user_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_follow_author_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuggestionRefresh',
+            fields=[
+                ('user_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FollowSuggestion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Вес')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Рекомендуемый автор')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='suggestions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-score'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='followsuggestion',
+            index=models.Index(fields=['user', '-score'], name='suggestion_user_score_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='followsuggestion',
+            unique_together={('user', 'author')},
+        ),
+    ]
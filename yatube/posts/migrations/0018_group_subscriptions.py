@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0017_mute'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupSubscription',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date'], name='post_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date'], name='post_group_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='groupsubscription',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscribers', to='posts.Group', verbose_name='Группа'),
+        ),
+        migrations.AddField(
+            model_name='groupsubscription',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='group_subscriptions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='groupsubscription',
+            unique_together={('user', 'group')},
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max
+
+
+def fill_stats(apps, schema_editor):
+    """Сводка по уже опубликованным записям."""
+    Post = apps.get_model('posts', 'Post')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    GroupAuthor = apps.get_model('posts', 'GroupAuthor')
+    posts = Post.objects.filter(group__isnull=False).order_by()
+    GroupAuthor.objects.bulk_create(
+        GroupAuthor(group_id=row['group'], author_id=row['author'],
+                    posts=row['posts'])
+        for row in posts.values('group', 'author').annotate(
+            posts=Count('id')).iterator())
+    GroupStats.objects.bulk_create(
+        GroupStats(group_id=row['group'], posts_count=row['posts_count'],
+                   authors_count=row['authors_count'],
+                   last_post_date=row['last_post_date'])
+        for row in posts.values('group').annotate(
+            posts_count=Count('id'),
+            authors_count=Count('author', distinct=True),
+            last_post_date=Max('pub_date')).iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0018_group_subscriptions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('authors_count', models.PositiveIntegerField(default=0, verbose_name='Авторов')),
+                ('last_post_date', models.DateTimeField(blank=True, null=True, verbose_name='Последняя запись')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='groupstats',
+            index=models.Index(fields=['-last_post_date'], name='groupstats_activity_idx'),
+        ),
+        migrations.AddField(
+            model_name='groupauthor',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='groupauthor',
+            name='group',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Group'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='groupauthor',
+            unique_together={('group', 'author')},
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_group_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('bucket', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('kind', 'bucket', 'object_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_activity_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='views',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Просмотры'),
+        ),
+    ]
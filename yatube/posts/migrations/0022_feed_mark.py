@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0021_post_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedMark',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_mark', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('seen', models.DateTimeField(verbose_name='Лента просмотрена')),
+                ('unread', models.PositiveIntegerField(default=0, verbose_name='Новых записей')),
+            ],
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0023_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Тег')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст со ссылками'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст со ссылками'),
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='posts.Post')),
+                ('tag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='post_links', to='posts.Tag')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Mention',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comment', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Comment')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['tag', '-pub_date'], name='post_tag_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='posttag',
+            unique_together={('post', 'tag')},
+        ),
+        migrations.AddIndex(
+            model_name='mention',
+            index=models.Index(fields=['user', '-id'], name='mention_user_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='mention',
+            unique_together={('user', 'post', 'comment')},
+        ),
+    ]
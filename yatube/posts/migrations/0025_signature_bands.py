@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_mentions_and_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SignatureBand',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField()),
+                ('post', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='signature_bands', to='posts.Post')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='signatureband',
+            index=models.Index(fields=['key', 'post'], name='signature_band_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='signatureband',
+            unique_together={('post', 'key')},
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_signature_bands'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedRefresh',
+            fields=[
+                ('post_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Близость')),
+                ('post', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='posts.Post')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post', verbose_name='Похожая запись')),
+            ],
+            options={
+                'ordering': ['-score'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='relatedpost',
+            index=models.Index(fields=['post', '-score'], name='related_post_score_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='relatedpost',
+            unique_together={('post', 'related')},
+        ),
+    ]
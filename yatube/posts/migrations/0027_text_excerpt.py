@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0026_related_posts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=300, verbose_name='Начало текста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=300, verbose_name='Начало текста'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст в HTML'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст в HTML'),
+        ),
+    ]
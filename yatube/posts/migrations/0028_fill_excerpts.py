@@ -0,0 +1,46 @@
+import re
+
+from django.db import migrations
+
+# Копия posts.markup.to_excerpt на момент миграции: код приложения
+# может поменяться, а миграция должна работать как раньше.
+EXCERPT_LENGTH = 300
+SPACE_RE = re.compile(r'\s+')
+FORMAT_RE = re.compile(r'\*\*|`')
+CHUNK_SIZE = 500
+
+
+def to_excerpt(text):
+    text = SPACE_RE.sub(' ', FORMAT_RE.sub('', text)).strip()
+    if len(text) <= EXCERPT_LENGTH:
+        return text
+    cut = text[:EXCERPT_LENGTH - 1]
+    if ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip('.,;:!?') + '…'
+
+
+def fill_excerpts(apps, schema_editor):
+    """Выдержки для записей и комментариев, сохранённых без них."""
+    for name in ('Post', 'Comment'):
+        model = apps.get_model('posts', name)
+        rows = model.objects.filter(excerpt='').exclude(text='').order_by(
+            'id').values_list('id', 'text').iterator(chunk_size=CHUNK_SIZE)
+        chunk = []
+        for pk, text in rows:
+            chunk.append(model(id=pk, excerpt=to_excerpt(text)))
+            if len(chunk) == CHUNK_SIZE:
+                model.objects.bulk_update(chunk, ['excerpt'])
+                chunk = []
+        model.objects.bulk_update(chunk, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0027_text_excerpt'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,30 @@
-from django.db import models
+from collections import Counter
+
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models import Case, F, Q, Value, When
 from django.contrib.auth import get_user_model
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from .compression import column_value, decode
+from .markup import EXCERPT_LENGTH, render_many
+from .placeholders import make_placeholder
+from .storage import media_storage
+from .threads import PATH_SEP, ancestor_paths, path_segment
 
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def for_list(self):
+        """
+        Записи для лент и списков: полный текст и его HTML не
+        загружаются, карточкам хватает выдержки excerpt.
+        """
+        return self.defer('text', 'text_html')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст постов',
@@ -27,15 +48,118 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
-        blank=True)
+        storage=media_storage,
+        blank=True,
+        db_index=True)
+    placeholder_color = models.CharField(
+        max_length=7,
+        blank=True,
+        editable=False,
+        verbose_name='Основной цвет картинки')
+    placeholder = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Превью картинки')
+    text_html = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Текст в HTML')
+    excerpt = models.CharField(
+        max_length=EXCERPT_LENGTH,
+        blank=True,
+        editable=False,
+        verbose_name='Начало текста')
+    views = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Просмотры')
+
+    objects = PostQuerySet.as_manager()
+
+    # Имя картинки на момент загрузки из БД, нужно для учёта ссылок.
+    _loaded_image = ''
+    # Группа и автор на момент загрузки, нужны для сводки по группам.
+    _loaded_group = (None, None)
+    # Поля, которые при POST_TEXT_COMPRESSION хранятся сжатыми, и их
+    # значения на момент загрузки: (текст, лежал ли он сжатым).
+    packed_fields = ('text', 'text_html')
+    _loaded_texts = {}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Длинные тексты могут лежать сжатыми, см. posts.compression.
+        instance._loaded_texts = {}
+        for name in cls.packed_fields:
+            if name in instance.__dict__:
+                stored = instance.__dict__[name]
+                instance.__dict__[name] = decode(stored)
+                instance._loaded_texts[name] = (
+                    instance.__dict__[name], not isinstance(stored, str))
+        instance._loaded_image = instance.__dict__.get('image')
+        instance._loaded_group = (instance.__dict__.get('group_id'),
+                                  instance.__dict__.get('author_id'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.image.name != self._loaded_image:
+            self.placeholder_color, self.placeholder = (
+                make_placeholder(self.image) if self.image else ('', ''))
+        # Запись из списка с отложенным текстом сохраняется без него.
+        if 'text' not in self.get_deferred_fields():
+            render_many([self])
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Просмотры прибавляет flush_views через F(), сохранение не
+            # должно затирать их значением на момент загрузки записи.
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'views'
+                and field.attname not in deferred]
+        packed = self.pack_texts(kwargs)
+        super().save(*args, **kwargs)
+        # Сжатые тексты дописываются отдельным UPDATE: сигналам после
+        # сохранения нужен обычный текст. Если запрос не дойдёт, текст
+        # просто останется несжатым.
+        if packed:
+            Post.objects.filter(pk=self.pk).update(**packed)
+
+    def pack_texts(self, kwargs):
+        """
+        Сжатые значения изменённых текстов. Текст, который не менялся
+        и уже лежит в нужном виде, убирается из update_fields.
+        """
+        packed = {}
+        update_fields = kwargs.get('update_fields')
+        for name in self.packed_fields:
+            if name not in self.__dict__ or (
+                    update_fields is not None and name not in update_fields):
+                continue
+            value = column_value(self.__dict__[name])
+            is_packed = not isinstance(value, str)
+            if self._loaded_texts.get(name) == (
+                    self.__dict__[name], is_packed):
+                kwargs['update_fields'] = update_fields = [
+                    field for field in update_fields if field != name]
+            elif is_packed:
+                packed[name] = value
+        return packed
 
     def __str__(self):
-        return self.text
+        # В списках полный текст отложен, его загрузка - лишний запрос.
+        return self.excerpt or self.__dict__.get('text', '')
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Модель Post'
         verbose_name_plural = 'Модель Post'
+        indexes = [
+            # Ленты автора и группы, а также их слияние в ленте подписок.
+            models.Index(fields=['author', '-pub_date'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date'],
+                         name='post_group_date_idx'),
+        ]
 
 
 class Group(models.Model):
@@ -67,15 +191,98 @@ class Comment(models.Model):
     text = models.TextField(
         verbose_name='Текст комментария',
         help_text='Текст нового комментария')
+    text_html = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Текст в HTML')
+    excerpt = models.CharField(
+        max_length=EXCERPT_LENGTH,
+        blank=True,
+        editable=False,
+        verbose_name='Начало текста')
     created = models.DateTimeField(
         verbose_name='Дата публикации',
         auto_now_add=True)
+    # Ключ идемпотентности для записи комментариев из очереди.
+    token = models.UUIDField(
+        unique=True,
+        null=True,
+        editable=False)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='replies',
+        verbose_name='Ответ на комментарий')
+    # Материализованный путь ветки, см. posts.threads.
+    path = models.CharField(
+        max_length=255,
+        default='',
+        editable=False)
+    depth = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False)
+    # Число всех потомков, а не только прямых ответов.
+    replies_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Ответов в ветке')
 
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        if not self.path:
+            self.place(self.parent)
+        render_many([self])
+        super().save(*args, **kwargs)
+
+    def place(self, parent=None):
+        """
+        Задаёт родителя, путь и глубину комментария. Ответ на
+        комментарий глубже COMMENTS_MAX_DEPTH становится его соседом.
+        """
+        if parent is not None and parent.depth >= settings.COMMENTS_MAX_DEPTH:
+            self.parent_id = parent.parent_id
+            prefix = parent.path.rpartition(PATH_SEP)[0]
+        else:
+            self.parent = parent
+            prefix = parent.path if parent is not None else ''
+        if prefix:
+            self.path = prefix + PATH_SEP + path_segment(root=False)
+            self.depth = prefix.count(PATH_SEP) + 1
+        else:
+            self.path = path_segment(root=True)
+            self.depth = 0
+
+    @classmethod
+    def count_replies(cls, post_id, paths, delta=1):
+        """
+        Меняет на delta счётчики ответов у всех предков комментариев
+        с путями paths одним запросом.
+        """
+        counts = Counter(
+            ancestor for path in paths for ancestor in ancestor_paths(path))
+        if not counts:
+            return
+        cls.objects.filter(post_id=post_id, path__in=counts).update(
+            replies_count=F('replies_count') + Case(
+                *[When(path=path, then=Value(count * delta))
+                  for path, count in counts.items()],
+                output_field=models.IntegerField()))
+
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_created_idx'),
+        ]
+        constraints = [
+            # Уникальный индекс заодно обслуживает выборку ветки диапазоном.
+            models.UniqueConstraint(fields=['post', 'path'],
+                                    name='comment_post_path_uniq'),
+        ]
 
 
 class Follow(models.Model):
@@ -93,3 +300,398 @@ class Follow(models.Model):
     class Meta:
         unique_together = ('user',
                            'author',)
+        indexes = [
+            # Подписчики автора; по (user, author) работает unique_together.
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+
+
+class GroupStats(models.Model):
+    """Сводка по группе для каталога, обновляется при изменении записей."""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats')
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Записей')
+    authors_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Авторов')
+    last_post_date = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Последняя запись')
+
+    @classmethod
+    def post_added(cls, group_id, author_id, pub_date):
+        """Учитывает запись, появившуюся в группе."""
+        new_author = GroupAuthor.change(group_id, author_id, 1)
+        cls.objects.bulk_create([cls(group_id=group_id)],
+                                ignore_conflicts=True)
+        cls.objects.filter(group_id=group_id).update(
+            posts_count=F('posts_count') + 1,
+            authors_count=F('authors_count') + int(new_author),
+            last_post_date=Case(
+                When(Q(last_post_date__isnull=True)
+                     | Q(last_post_date__lt=pub_date),
+                     then=Value(pub_date,
+                                output_field=models.DateTimeField())),
+                default=F('last_post_date')))
+
+    @classmethod
+    def post_removed(cls, group_id, author_id, pub_date):
+        """Учитывает запись, ушедшую из группы или удалённую."""
+        gone_author = GroupAuthor.change(group_id, author_id, -1)
+        cls.objects.filter(group_id=group_id, posts_count__gt=0).update(
+            posts_count=F('posts_count') - 1,
+            authors_count=F('authors_count') - int(gone_author))
+        # Дату последней записи пересчитываем, только если ушла она сама.
+        if cls.objects.filter(group_id=group_id,
+                              last_post_date__lte=pub_date).exists():
+            latest = Post.objects.filter(group_id=group_id).order_by(
+                '-pub_date').values_list('pub_date', flat=True).first()
+            cls.objects.filter(group_id=group_id).update(
+                last_post_date=latest)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-last_post_date'],
+                         name='groupstats_activity_idx'),
+        ]
+
+
+class GroupAuthor(models.Model):
+    """Число записей автора в группе, по нему считаются активные авторы."""
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False)
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+')
+    posts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('group', 'author')
+
+    @classmethod
+    def change(cls, group_id, author_id, delta):
+        """
+        Меняет счётчик записей автора в группе. Возвращает True, если
+        автор появился в группе или пропал из неё.
+        """
+        rows = cls.objects.filter(group_id=group_id, author_id=author_id)
+        if delta > 0:
+            if rows.update(posts=F('posts') + delta):
+                return False
+            try:
+                with transaction.atomic():
+                    cls.objects.create(group_id=group_id,
+                                       author_id=author_id, posts=delta)
+                return True
+            except IntegrityError:
+                rows.update(posts=F('posts') + delta)
+                return False
+        rows.filter(posts__gte=-delta).update(posts=F('posts') + delta)
+        return bool(rows.filter(posts=0).delete()[0])
+
+
+class GroupSubscription(models.Model):
+    """Подписка на все записи группы в ленте подписок."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='group_subscriptions',
+        db_index=False)
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='subscribers',
+        verbose_name='Группа')
+
+    class Meta:
+        unique_together = ('user', 'group')
+
+
+class Mute(models.Model):
+    """Автор, которого пользователь скрыл из лент и комментариев."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mutes',
+        db_index=False)
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Скрытый автор')
+
+    class Meta:
+        unique_together = ('user', 'author')
+
+
+class FollowSuggestion(models.Model):
+    """Рекомендация автора, посчитанная командой build_suggestions."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions',
+        db_index=False)
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рекомендуемый автор')
+    score = models.FloatField(verbose_name='Вес')
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = ('user', 'author')
+        indexes = [
+            models.Index(fields=['user', '-score'],
+                         name='suggestion_user_score_idx'),
+        ]
+
+
+class SuggestionRefresh(models.Model):
+    """Пользователь, чьи подписки изменились после расчёта рекомендаций."""
+    # Без внешнего ключа: отметку ставит и каскадное удаление подписок
+    # вместе с самим пользователем.
+    user_id = models.PositiveIntegerField(primary_key=True)
+
+
+class ActivityCounter(models.Model):
+    """
+    Счётчик событий (комментариев, новых записей) по объекту за
+    короткий интервал времени, см. posts.trending.
+    """
+    kind = models.CharField(max_length=10)
+    object_id = models.PositiveIntegerField()
+    bucket = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('kind', 'bucket', 'object_id')
+
+
+class FeedMark(models.Model):
+    """
+    Когда пользователь последний раз открывал ленту подписок и сколько
+    записей в ней появилось с тех пор, см. posts.unread.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='feed_mark')
+    seen = models.DateTimeField(verbose_name='Лента просмотрена')
+    unread = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Новых записей')
+
+
+class Notification(models.Model):
+    """
+    Уведомление в ящике пользователя. Пока оно не прочитано, события
+    с тем же ключом (комментарии к одной записи, новые подписчики)
+    копятся в нём счётчиком, см. posts.notifications.
+    """
+    COMMENT = 'comment'
+    FOLLOW = 'follow'
+    KINDS = (
+        (COMMENT, 'Комментарии'),
+        (FOLLOW, 'Подписчики'),
+    )
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        db_index=False)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    key = models.CharField(max_length=50)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+')
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        verbose_name='Последний участник')
+    count = models.PositiveIntegerField(default=1)
+    # Время последнего события в микросекундах, по нему сортируется ящик.
+    seq = models.BigIntegerField()
+    read = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', '-seq'],
+                         name='notification_inbox_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'key'], condition=Q(read=False),
+                name='notification_unread_key'),
+        ]
+
+
+class Tag(models.Model):
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Тег')
+
+    def __str__(self):
+        return self.name
+
+
+class PostTag(models.Model):
+    """
+    Тег записи. Дата записи повторена здесь, чтобы лента тега
+    читалась по индексу (tag, -pub_date) без сортировки.
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='tag_links')
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='post_links',
+        db_index=False)
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('post', 'tag')
+        indexes = [
+            models.Index(fields=['tag', '-pub_date'],
+                         name='post_tag_date_idx'),
+        ]
+
+
+class Mention(models.Model):
+    """Упоминание пользователя в записи или комментарии к ней."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+        db_index=False)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+')
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+')
+
+    class Meta:
+        unique_together = ('user', 'post', 'comment')
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='mention_user_idx'),
+        ]
+
+
+class SignatureBand(models.Model):
+    """
+    Ключ полосы MinHash-подписи записи для поиска почти одинаковых
+    текстов, см. posts.duplicates.
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='signature_bands',
+        db_index=False)
+    key = models.BigIntegerField()
+
+    class Meta:
+        unique_together = ('post', 'key')
+        indexes = [
+            models.Index(fields=['key', 'post'], name='signature_band_idx'),
+        ]
+
+
+class RelatedPost(models.Model):
+    """Похожая запись, посчитанная командой build_related."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='related_links',
+        db_index=False)
+    related = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожая запись')
+    score = models.FloatField(verbose_name='Близость')
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = ('post', 'related')
+        indexes = [
+            models.Index(fields=['post', '-score'],
+                         name='related_post_score_idx'),
+        ]
+
+
+class RelatedRefresh(models.Model):
+    """Запись, для которой ещё не посчитаны похожие."""
+    post_id = models.PositiveIntegerField(primary_key=True)
+
+
+class MediaFile(models.Model):
+    """Счётчик ссылок постов на файл картинки в хранилище."""
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Имя файла')
+    refs = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество ссылок')
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def acquire(cls, name):
+        """Увеличивает счётчик ссылок на файл."""
+        if cls.objects.filter(name=name).update(refs=F('refs') + 1):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, refs=1)
+        except IntegrityError:
+            cls.objects.filter(name=name).update(refs=F('refs') + 1)
+
+    @classmethod
+    def release(cls, name):
+        """
+        Уменьшает счётчик ссылок, удаляя файл и его миниатюры,
+        когда на него больше никто не ссылается.
+        """
+        cls.objects.filter(name=name, refs__gt=0).update(refs=F('refs') - 1)
+        if cls.objects.filter(name=name, refs=0).delete()[0]:
+            transaction.on_commit(lambda: delete_unused_media(name))
+
+
+def delete_unused_media(name):
+    """
+    Удаляет файл с миниатюрами, если на него так и не появилось
+    ссылок и его не загружали повторно за MEDIA_REUSE_GRACE секунд:
+    пост с такой же картинкой может быть ещё не сохранён.
+    """
+    if (MediaFile.objects.filter(name=name).exists()
+            or Post.objects.filter(image=name).exists()
+            or media_storage.used_since(name, settings.MEDIA_REUSE_GRACE)):
+        return False
+    delete_thumbnails(ImageFile(name, media_storage))
+    return True
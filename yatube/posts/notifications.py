@@ -0,0 +1,167 @@
+import itertools
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+
+from . import graph
+from .models import Notification, Post
+from .queues import SpoolQueue
+from .utils import parse_id
+
+# Число непрочитанных уведомлений пользователя.
+UNREAD_KEY = 'notify:unread:{}'
+
+notification_queue = SpoolQueue('notifications')
+
+
+def notify(event):
+    """
+    Ставит событие в очередь уведомлений. Для комментария получатель -
+    автор записи, он определяется при записи пачки.
+    """
+    if settings.NOTIFY_BATCH_SIZE <= 1:
+        write_events([event])
+        return
+    notification_queue.put(event)
+    if notification_queue.is_due(settings.NOTIFY_BATCH_SIZE,
+                                 settings.NOTIFY_FLUSH_INTERVAL):
+        flush_notifications()
+
+
+def comment_added(post_id, actor_id):
+    notify({'kind': Notification.COMMENT, 'post': post_id,
+            'actor': actor_id})
+
+
+def followed(author_id, actor_id):
+    notify({'kind': Notification.FOLLOW, 'recipient': author_id,
+            'actor': actor_id})
+
+
+def flush_notifications(stale_after=None):
+    """Записывает события из очереди пачками."""
+    written = 0
+    for path, events in notification_queue.take(stale_after):
+        written += write_events(events)
+        notification_queue.done(path)
+    return written
+
+
+def write_events(events):
+    """
+    Сворачивает события по получателю и ключу и записывает их:
+    непрочитанное уведомление с тем же ключом получает прибавку к
+    счётчику, остальные создаются одним запросом. Повторная запись
+    пачки после сбоя учтёт её события дважды.
+    """
+    authors = dict(Post.objects.filter(id__in={
+        event['post'] for event in events if event.get('post')
+    }).values_list('id', 'author_id'))
+    groups = OrderedDict()
+    for event in events:
+        post_id = event.get('post')
+        if event['kind'] == Notification.COMMENT:
+            if post_id not in authors:
+                continue
+            recipient = authors[post_id]
+            key = f'{Notification.COMMENT}:{post_id}'
+        else:
+            recipient = event['recipient']
+            key = event['kind']
+        actor = event['actor']
+        if actor == recipient or graph.contains(graph.muted(recipient),
+                                                actor):
+            continue
+        group = groups.setdefault((recipient, key), {
+            'kind': event['kind'], 'post': post_id, 'count': 0})
+        group['count'] += 1
+        group['actor'] = actor
+    if not groups:
+        return 0
+    recipients = {recipient for recipient, _ in groups}
+    # Своё значение seq каждой строке, чтобы курсор не терял соседей.
+    stamps = itertools.count(time.time_ns() // 1000)
+    with transaction.atomic():
+        existing = Notification.objects.filter(
+            recipient_id__in=recipients, read=False,
+            key__in={key for _, key in groups}).only(
+            'id', 'recipient_id', 'key').in_bulk()
+        updated = []
+        for notification in existing.values():
+            group = groups.pop(
+                (notification.recipient_id, notification.key), None)
+            if group is None:
+                continue
+            notification.count = F('count') + group['count']
+            notification.actor_id = group['actor']
+            notification.seq = next(stamps)
+            updated.append(notification)
+        Notification.objects.bulk_update(
+            updated, ['count', 'actor', 'seq'])
+        created = [
+            Notification(
+                recipient_id=recipient, key=key, kind=group['kind'],
+                post_id=group['post'], actor_id=group['actor'],
+                count=group['count'], seq=next(stamps))
+            for (recipient, key), group in groups.items()
+        ]
+        Notification.objects.bulk_create(created, ignore_conflicts=True)
+        # Строку с тем же ключом мог успеть создать параллельный запуск,
+        # тогда вставка пропущена и счётчик прибавляется к его строке.
+        inserted = set(Notification.objects.filter(
+            recipient_id__in=recipients,
+            seq__in=[notification.seq for notification in created],
+        ).values_list('recipient_id', 'key'))
+        for (recipient, key), group in groups.items():
+            if (recipient, key) in inserted:
+                continue
+            Notification.objects.filter(
+                recipient_id=recipient, key=key, read=False).update(
+                count=F('count') + group['count'],
+                actor_id=group['actor'], seq=next(stamps))
+        transaction.on_commit(lambda: cache.delete_many(
+            [UNREAD_KEY.format(user_id) for user_id in recipients]))
+    return len(updated) + len(groups)
+
+
+def unread_count(user):
+    """Число непрочитанных уведомлений, из кэша."""
+    if not user.is_authenticated:
+        return 0
+    key = UNREAD_KEY.format(user.id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(
+            recipient_id=user.id, read=False).count()
+        if not connection.in_atomic_block:
+            cache.set(key, count, settings.NOTIFY_UNREAD_TIMEOUT)
+    return count
+
+
+def get_inbox_context(user, cursor=None):
+    """
+    Страница ящика по индексу (recipient, -seq): курсор - seq
+    последнего показанного уведомления. Первая страница отмечает
+    все уведомления прочитанными.
+    """
+    notifications = Notification.objects.filter(
+        recipient_id=user.id).select_related('actor', 'post').defer(
+        'post__text', 'post__text_html').order_by('-seq')
+    if cursor:
+        if parse_id(cursor) is None:
+            raise ValueError('Неверный курсор')
+        notifications = notifications.filter(seq__lt=parse_id(cursor))
+    notifications = list(notifications[:settings.NUM_NOTIFICATIONS + 1])
+    next_cursor = None
+    if len(notifications) > settings.NUM_NOTIFICATIONS:
+        notifications = notifications[:settings.NUM_NOTIFICATIONS]
+        next_cursor = notifications[-1].seq
+    if not cursor and Notification.objects.filter(
+            recipient_id=user.id, read=False).update(read=True):
+        transaction.on_commit(lambda: cache.set(
+            UNREAD_KEY.format(user.id), 0, settings.NOTIFY_UNREAD_TIMEOUT))
+    return {'notifications': notifications, 'next_cursor': next_cursor}
@@ -0,0 +1,34 @@
+import base64
+from io import BytesIO
+
+from django.core.exceptions import SuspiciousFileOperation
+from PIL import Image, ImageFilter, ImageOps
+
+# Пропорции совпадают с миниатюрой 960x600 в карточке поста.
+PLACEHOLDER_SIZE = (16, 10)
+
+
+def make_placeholder(image_file):
+    """
+    Считает основной цвет картинки и крошечное размытое превью.
+    Возвращает пару (цвет '#rrggbb', data URI), для нечитаемого
+    файла - пустые строки.
+    """
+    try:
+        with Image.open(image_file) as image:
+            image.draft('RGB', (PLACEHOLDER_SIZE[0] * 8,
+                                PLACEHOLDER_SIZE[1] * 8))
+            image = image.convert('RGB')
+            preview = ImageOps.fit(image, PLACEHOLDER_SIZE, Image.BOX)
+    except (OSError, ValueError, SuspiciousFileOperation):
+        return '', ''
+    finally:
+        if not getattr(image_file, 'closed', True):
+            image_file.seek(0)
+    color = '#%02x%02x%02x' % preview.resize((1, 1), Image.BOX).getpixel(
+        (0, 0))
+    buffer = BytesIO()
+    preview.filter(ImageFilter.GaussianBlur(1)).save(
+        buffer, 'PNG', optimize=True)
+    data = base64.b64encode(buffer.getvalue()).decode()
+    return color, f'data:image/png;base64,{data}'
@@ -0,0 +1,223 @@
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files import locks
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import tags, trending
+from .markup import render_many
+from .models import Comment, Post, User
+
+QUEUE_FILE = 'queue.jsonl'
+# Сколько ожидающих комментариев помнить в сессии пользователя.
+PENDING_LIMIT = 20
+
+
+class SpoolQueue:
+    """
+    Надёжная локальная очередь в каталоге SPOOL_ROOT.
+    Записи дописываются в файл с fsync, обработчик забирает файл
+    целиком переименованием и удаляет его только после обработки,
+    поэтому после падения процесса записи не теряются.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.count = 0
+        self.first_put = None
+
+    @property
+    def directory(self):
+        return os.path.join(settings.SPOOL_ROOT, self.name)
+
+    def put(self, item):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, QUEUE_FILE)
+        data = (json.dumps(item, ensure_ascii=False) + '\n').encode()
+        written = False
+        while not written:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                locks.lock(fd, locks.LOCK_EX)
+                # Пока ждали блокировку, файл могли забрать на обработку.
+                try:
+                    written = os.path.samestat(os.fstat(fd), os.stat(path))
+                except FileNotFoundError:
+                    written = False
+                if written:
+                    os.write(fd, data)
+                    os.fsync(fd)
+            finally:
+                locks.unlock(fd)
+                os.close(fd)
+        with self.lock:
+            self.count += 1
+            if self.first_put is None:
+                self.first_put = time.monotonic()
+
+    def is_due(self, batch_size, interval):
+        """Пора ли сбрасывать очередь: набралась пачка или истёк срок."""
+        with self.lock:
+            return self.count >= batch_size or (
+                self.first_put is not None
+                and time.monotonic() - self.first_put >= interval)
+
+    def take(self, stale_after=None):
+        """
+        Забирает накопленные записи пачками (путь, записи).
+        С stale_after подбирает и пачки, брошенные упавшими
+        обработчиками дольше stale_after секунд назад.
+        """
+        with self.lock:
+            self.count = 0
+            self.first_put = None
+        paths = []
+        batch = os.path.join(
+            self.directory, f'batch-{uuid.uuid4().hex}.jsonl')
+        try:
+            os.rename(os.path.join(self.directory, QUEUE_FILE), batch)
+            # Время изменения - момент захвата, по нему ищут брошенные пачки.
+            os.utime(batch)
+            paths.append(batch)
+        except FileNotFoundError:
+            pass
+        if stale_after is not None:
+            deadline = time.time() - stale_after
+            paths.extend(
+                path for path in glob.glob(
+                    os.path.join(self.directory, 'batch-*.jsonl'))
+                if path != batch and os.path.getmtime(path) < deadline)
+        for path in paths:
+            with open(path, 'rb') as f:
+                locks.lock(f, locks.LOCK_EX)
+                lines = f.read().splitlines()
+                locks.unlock(f)
+            yield path, [json.loads(line) for line in lines if line.strip()]
+
+    def done(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+comment_queue = SpoolQueue('comments')
+
+
+def enqueue_comment(request, post_id, text, parent_id=None):
+    """
+    Ставит комментарий в очередь и запоминает его в сессии,
+    чтобы автор видел его до записи в БД.
+    """
+    token = uuid.uuid4().hex
+    comment_queue.put({
+        'token': token,
+        'post': post_id,
+        'author': request.user.id,
+        'text': text,
+        'parent': parent_id,
+        'created': timezone.now().isoformat(),
+    })
+    pending = request.session.get('pending_comments', [])
+    pending.append({'token': token, 'post': post_id, 'text': text})
+    request.session['pending_comments'] = pending[-PENDING_LIMIT:]
+    if comment_queue.is_due(settings.COMMENT_BATCH_SIZE,
+                            settings.COMMENT_FLUSH_INTERVAL):
+        flush_comments()
+
+
+def flush_comments(stale_after=None):
+    """Записывает комментарии из очереди в БД пачками."""
+    flushed = 0
+    for path, items in comment_queue.take(stale_after):
+        post_groups = dict(Post.objects.filter(
+            id__in={item['post'] for item in items}
+        ).values_list('id', 'group_id'))
+        author_ids = set(User.objects.filter(
+            id__in={item['author'] for item in items}
+        ).values_list('id', flat=True))
+        parents = Comment.objects.filter(
+            id__in={item.get('parent') for item in items} - {None},
+        ).only('id', 'post_id', 'parent_id', 'path', 'depth').in_bulk()
+        comments = []
+        submitted = {}
+        for item in items:
+            if item['post'] not in post_groups or (
+                    item['author'] not in author_ids):
+                continue
+            parent = parents.get(item.get('parent'))
+            if item.get('parent') and (
+                    parent is None or parent.post_id != item['post']):
+                continue
+            comment = Comment(
+                token=uuid.UUID(item['token']), post_id=item['post'],
+                author_id=item['author'], text=item['text'])
+            comment.place(parent)
+            comments.append(comment)
+            if item.get('created'):
+                submitted[comment.token] = parse_datetime(item['created'])
+        # Имена из всех комментариев пачки разрешаются одним запросом.
+        render_many(comments)
+        with transaction.atomic():
+            replies = [comment for comment in comments if comment.depth]
+            if replies:
+                # При повторной обработке пачки ответы уже учтены.
+                saved = set(Comment.objects.filter(
+                    token__in=[reply.token for reply in replies]
+                ).values_list('token', flat=True))
+                replies = [reply for reply in replies
+                           if reply.token not in saved]
+            # Повторная обработка пачки после сбоя не создаст дублей.
+            Comment.objects.bulk_create(comments, ignore_conflicts=True)
+            if submitted:
+                # auto_now_add ставит время записи пачки, а показывать
+                # нужно время отправки комментария.
+                Comment.objects.filter(token__in=list(submitted)).update(
+                    created=Case(*[
+                        When(token=token, then=Value(created))
+                        for token, created in submitted.items()],
+                        output_field=DateTimeField()))
+            paths = defaultdict(list)
+            for reply in replies:
+                paths[reply.post_id].append(reply.path)
+            for post_id, post_paths in paths.items():
+                Comment.count_replies(post_id, post_paths)
+            tags.index_comments(comments)
+        trending.record_comments(
+            [(comment.post_id, post_groups[comment.post_id])
+             for comment in comments])
+        comment_queue.done(path)
+        flushed += len(comments)
+    return flushed
+
+
+def get_pending_comments(request, post):
+    """Комментарии пользователя к посту, ещё не записанные в БД."""
+    if not request.user.is_authenticated:
+        return []
+    pending = request.session.get('pending_comments')
+    if not pending:
+        return []
+    tokens = [item['token'] for item in pending if item['post'] == post.id]
+    if not tokens:
+        return []
+    saved = {token.hex for token in Comment.objects.filter(
+        token__in=tokens).values_list('token', flat=True)}
+    if saved:
+        request.session['pending_comments'] = [
+            item for item in pending if item['token'] not in saved]
+    return [
+        Comment(post=post, author=request.user, text=item['text'])
+        for item in pending
+        if item['post'] == post.id and item['token'] not in saved
+    ]
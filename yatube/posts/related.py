@@ -0,0 +1,94 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+from .compression import decode
+from .models import Post
+from .suggestions import expand, sum_by_key, top_per_row
+
+# Слова короче трёх букв почти всегда шум.
+WORD_RE = re.compile(r'\w{3,}')
+# Группа записи - отдельный признак, весит как слово, встреченное
+# в тексте GROUP_COUNT раз.
+GROUP_TERM = 'group:{}'
+GROUP_COUNT = 3
+LOAD_CHUNK_SIZE = 2000
+
+
+class TextMatrix:
+    """
+    TF-IDF векторы записей в виде разреженной матрицы CSR: строка -
+    запись, столбцы - слова и группа. Строки нормированы, так что
+    скалярное произведение строк - косинусная близость.
+    """
+
+    def __init__(self, ids, indptr, terms, counts, num_terms):
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = terms
+        rows = np.repeat(np.arange(len(ids)), np.diff(indptr))
+        self.df = np.bincount(terms, minlength=num_terms)
+        idf = np.log((1 + len(ids)) / (1 + self.df)) + 1
+        weights = (1 + np.log(counts)) * idf[terms]
+        norms = np.sqrt(np.bincount(
+            rows, weights=weights ** 2, minlength=len(ids)))
+        self.data = weights / norms[rows]
+        # Транспонированная матрица: записи с каждым словом.
+        order = np.argsort(terms, kind='stable')
+        self.t_indptr = np.zeros(num_terms + 1, dtype=np.int64)
+        np.cumsum(self.df, out=self.t_indptr[1:])
+        self.t_indices = rows[order]
+        self.t_data = self.data[order]
+
+    @classmethod
+    def load(cls):
+        vocabulary = {}
+        ids, indptr, terms, counts = [], [0], [], []
+        # values_list минует Post.from_db, тексты распаковываются здесь.
+        posts = Post.objects.order_by('id').values_list(
+            'id', 'text', 'group_id')
+        for pk, text, group_id in posts.iterator(chunk_size=LOAD_CHUNK_SIZE):
+            tokens = Counter(WORD_RE.findall(decode(text).lower()))
+            if group_id:
+                tokens[GROUP_TERM.format(group_id)] = GROUP_COUNT
+            for token, count in tokens.items():
+                terms.append(vocabulary.setdefault(token, len(vocabulary)))
+                counts.append(count)
+            ids.append(pk)
+            indptr.append(len(terms))
+        return cls(np.array(ids, dtype=np.int64),
+                   np.array(indptr, dtype=np.int64),
+                   np.array(terms, dtype=np.int64),
+                   np.array(counts, dtype=np.float64), len(vocabulary))
+
+    def index_of(self, post_ids):
+        """Номера строк записей, -1 для тех, кого нет в матрице."""
+        post_ids = np.asarray(post_ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, post_ids)
+        pos[pos == len(self.ids)] = 0
+        found = self.ids[pos] == post_ids
+        return np.where(found, pos, -1)
+
+
+def nearest(matrix, rows, top_k, max_df):
+    """
+    Ближайшие записи для строк rows: блок строк умножается на
+    транспонированную матрицу через списки записей каждого слова.
+    Слова, встречающиеся больше чем в max_df записях, пропускаются.
+    Возвращает (номер строки в rows, строка соседа, близость).
+    """
+    size = len(matrix.ids)
+    owners, terms = expand(matrix.indptr, matrix.indices, rows)
+    _, weights = expand(matrix.indptr, matrix.data, rows)
+    rare = matrix.df[terms] <= max_df
+    owners, terms, weights = owners[rare], terms[rare], weights[rare]
+    edge_owners, docs = expand(matrix.t_indptr, matrix.t_indices, terms)
+    _, doc_weights = expand(matrix.t_indptr, matrix.t_data, terms)
+    products = weights[edge_owners] * doc_weights
+    owners = owners[edge_owners]
+    keep = docs != rows[owners]
+    keys, scores = sum_by_key(owners[keep] * size + docs[keep],
+                              products[keep])
+    owners, docs = np.divmod(keys, size)
+    return top_per_row(owners, docs, scores, top_k)
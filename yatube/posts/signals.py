@@ -0,0 +1,119 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import duplicates, graph, tags, unread
+from .models import (Comment, Follow, GroupStats, MediaFile, Mute, Post,
+                     RelatedRefresh)
+from .storage import is_hashed_name
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, **kwargs):
+    """
+    Обновляет счётчики ссылок при загрузке или замене картинки.
+    Учитываются только файлы из хранилища с адресацией по содержимому,
+    старые файлы переносит команда dedupe_media.
+    """
+    old = instance._loaded_image
+    new = instance.image.name or ''
+    if old is None or old == new:
+        return
+    if is_hashed_name(new):
+        MediaFile.acquire(new)
+    if is_hashed_name(old):
+        MediaFile.release(old)
+    instance._loaded_image = new
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    """Освобождает картинку удалённого поста."""
+    if is_hashed_name(instance.image.name or ''):
+        MediaFile.release(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def count_reply(sender, instance, created, raw=False, **kwargs):
+    """Увеличивает счётчики ответов у предков нового ответа."""
+    if created and not raw and instance.depth:
+        Comment.count_replies(instance.post_id, [instance.path])
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_reply(sender, instance, **kwargs):
+    """
+    Уменьшает счётчики у предков удалённого ответа. Каскадно
+    удалённые потомки вызывают сигнал сами.
+    """
+    if instance.depth:
+        Comment.count_replies(instance.post_id, [instance.path], -1)
+
+
+@receiver(post_save, sender=Follow)
+def add_follow_edge(sender, instance, created, **kwargs):
+    if created:
+        graph.edge_changed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_follow_edge(sender, instance, **kwargs):
+    graph.edge_changed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Mute)
+def add_mute(sender, instance, created, **kwargs):
+    if created:
+        graph.mute_changed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Mute)
+def remove_mute(sender, instance, **kwargs):
+    graph.mute_changed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def update_group_stats(sender, instance, created, raw=False, **kwargs):
+    """Переносит запись в сводке групп при создании или смене группы."""
+    if raw:
+        return
+    old_group, old_author = instance._loaded_group
+    new = (instance.group_id, instance.author_id)
+    if (old_group, old_author) == new:
+        return
+    if old_group is not None:
+        GroupStats.post_removed(old_group, old_author, instance.pub_date)
+    if instance.group_id is not None:
+        GroupStats.post_added(
+            instance.group_id, instance.author_id, instance.pub_date)
+    instance._loaded_group = new
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_group_stats(sender, instance, **kwargs):
+    group_id, author_id = instance._loaded_group
+    if group_id is not None:
+        GroupStats.post_removed(group_id, author_id, instance.pub_date)
+
+
+@receiver(post_save, sender=Post)
+def count_unread(sender, instance, created, raw=False, **kwargs):
+    """Отмечает новую запись в лентах подписчиков."""
+    if created and not raw:
+        unread.post_published(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, raw=False, **kwargs):
+    """Обновляет теги, упоминания и отпечаток текста записи."""
+    if not raw and 'text' not in instance.get_deferred_fields():
+        tags.index_post(instance)
+        duplicates.index_post(instance)
+        # Похожие записи пересчитает build_related.
+        RelatedRefresh.objects.bulk_create(
+            [RelatedRefresh(post_id=instance.id)], ignore_conflicts=True)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment_text(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        tags.index_comments([instance])
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import posixpath
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+# Каталог картинок постов, совпадает с upload_to поля Post.image.
+UPLOAD_DIR = 'posts'
+
+
+def file_digest(content):
+    """Считает sha256 содержимого файла, читая его по частям."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_name(directory, digest, ext):
+    """Имя файла по хэшу содержимого: posts/ab/cd/abcd...ext."""
+    return posixpath.join(
+        directory, digest[:2], digest[2:4], digest + ext.lower())
+
+
+def is_hashed_name(name):
+    """Проверяет, что файл уже лежит по адресу своего хэша."""
+    parts = name.split('/')
+    if len(parts) < 3:
+        return False
+    digest = os.path.splitext(parts[-1])[0]
+    return (len(digest) == 64 and parts[-3] == digest[:2]
+            and parts[-2] == digest[2:4])
+
+
+def walk_files(root):
+    """Обходит дерево каталогов, не собирая его целиком в память."""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+@deconstructible
+class HashedMediaStorage(FileSystemStorage):
+    """
+    Хранилище картинок постов с адресацией по содержимому.
+    Одинаковые файлы сохраняются один раз, повторная загрузка
+    возвращает имя уже существующего файла.
+    """
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        ext = os.path.splitext(name)[1]
+        name = hashed_name(directory, file_digest(content), ext)
+        if self.exists(name):
+            try:
+                # Свежее время изменения защищает файл от удаления,
+                # пока пост с ним ещё не сохранён.
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # Файл успели удалить, пишем его заново.
+                pass
+        # Пишем во временный файл и атомарно переименовываем,
+        # чтобы параллельная загрузка того же файла не получила суффикс.
+        temp_name = super()._save(name + '.part', content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+    def used_since(self, name, seconds):
+        """Загружали ли файл, в том числе повторно, за seconds секунд."""
+        try:
+            return os.path.getmtime(self.path(name)) > time.time() - seconds
+        except FileNotFoundError:
+            return False
+
+
+media_storage = HashedMediaStorage()
@@ -0,0 +1,124 @@
+import numpy as np
+
+from .models import Follow
+
+# Сколько рёбер читать из БД за раз при загрузке графа.
+LOAD_CHUNK_SIZE = 100000
+
+
+class FollowMatrix:
+    """
+    Граф подписок в виде разреженной матрицы CSR: строка - читатель,
+    столбцы - авторы. Id пользователей сжаты в плотные индексы.
+    """
+
+    def __init__(self, users, authors):
+        self.ids = np.unique(np.concatenate([users, authors]))
+        rows = np.searchsorted(self.ids, users)
+        cols = np.searchsorted(self.ids, authors)
+        self.indptr, self.indices = self._csr(rows, cols)
+        # Транспонированная матрица: подписчики каждого автора.
+        self.t_indptr, self.t_indices = self._csr(cols, rows)
+
+    @classmethod
+    def load(cls):
+        edges = Follow.objects.order_by().values_list('user_id', 'author_id')
+        users, authors = [], []
+        chunk = []
+        for edge in edges.iterator(chunk_size=LOAD_CHUNK_SIZE):
+            chunk.append(edge)
+            if len(chunk) >= LOAD_CHUNK_SIZE:
+                array = np.array(chunk, dtype=np.int64)
+                users.append(array[:, 0])
+                authors.append(array[:, 1])
+                chunk = []
+        array = np.array(chunk, dtype=np.int64).reshape(-1, 2)
+        users.append(array[:, 0])
+        authors.append(array[:, 1])
+        return cls(np.concatenate(users), np.concatenate(authors))
+
+    def _csr(self, rows, cols):
+        order = np.lexsort((cols, rows))
+        counts = np.bincount(rows, minlength=len(self.ids))
+        indptr = np.zeros(len(self.ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return indptr, cols[order]
+
+    def index_of(self, user_ids):
+        """Плотные индексы пользователей, -1 для тех, кого нет в графе."""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, user_ids)
+        pos[pos == len(self.ids)] = 0
+        found = self.ids[pos] == user_ids
+        return np.where(found, pos, -1)
+
+
+def expand(indptr, indices, rows):
+    """
+    Разворачивает строки CSR в пары (номер строки в rows, столбец)
+    без циклов на Python.
+    """
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    owners = np.repeat(np.arange(len(rows)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths)
+    return owners, indices[np.repeat(starts, lengths) + offsets]
+
+
+def sum_by_key(keys, weights):
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=weights)
+
+
+def top_candidates(matrix, rows, top_k, max_fanout):
+    """
+    Кандидаты для читателей rows по совместным подпискам: читатель
+    похож на тех, кто подписан на тех же авторов, а вес кандидата -
+    сумма похожести его подписчиков. Возвращает массивы
+    (номер строки в rows, индекс автора, вес), по top_k на читателя.
+    """
+    size = len(matrix.ids)
+    # Похожие читатели: подписчики авторов из подписок читателя.
+    owners, authors = expand(matrix.indptr, matrix.indices, rows)
+    # Популярные авторы дают слабый сигнал и раздувают выборку.
+    popular = (matrix.t_indptr[authors + 1]
+               - matrix.t_indptr[authors]) > max_fanout
+    edge_owners, peers = expand(
+        matrix.t_indptr, matrix.t_indices, authors[~popular])
+    edge_owners = owners[~popular][edge_owners]
+    keep = peers != rows[edge_owners]
+    peer_keys, peer_weights = sum_by_key(
+        edge_owners[keep] * size + peers[keep], None)
+    peer_owners, peers = np.divmod(peer_keys, size)
+
+    # Кандидаты: авторы, на которых подписаны похожие читатели.
+    edge_owners, candidates = expand(matrix.indptr, matrix.indices, peers)
+    weights = peer_weights[edge_owners]
+    owners_of_candidates = peer_owners[edge_owners]
+    keys, scores = sum_by_key(
+        owners_of_candidates * size + candidates, weights)
+    owners_of_candidates, candidates = np.divmod(keys, size)
+
+    # Убираем себя и уже отслеживаемых авторов.
+    followed = owners * size + authors
+    keep = ~np.isin(keys, followed) & (
+        candidates != rows[owners_of_candidates])
+    owners_of_candidates = owners_of_candidates[keep]
+    candidates = candidates[keep]
+    scores = scores[keep]
+
+    return top_per_row(owners_of_candidates, candidates, scores, top_k)
+
+
+def top_per_row(rows, cols, scores, top_k):
+    """
+    Оставляет по top_k пар с наибольшим весом на каждую строку.
+    Возвращает (строки, столбцы, веса), строки по возрастанию.
+    """
+    order = np.lexsort((cols, -scores, rows))
+    rows = rows[order]
+    starts = np.searchsorted(rows, rows)
+    rank = np.arange(len(order)) - starts
+    top = order[rank < top_k]
+    return rows[rank < top_k], cols[top], scores[top]
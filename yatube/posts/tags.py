@@ -0,0 +1,51 @@
+from .models import Comment, Mention, PostTag, Tag
+
+
+def get_tags(names):
+    """Теги по именам, недостающие создаются. Два запроса на всё."""
+    if not names:
+        return {}
+    Tag.objects.bulk_create([Tag(name=name) for name in names],
+                            ignore_conflicts=True)
+    return Tag.objects.in_bulk(names, field_name='name')
+
+
+def index_post(post):
+    """
+    Переписывает теги и упоминания записи по её тексту.
+    Имена разобраны в Post.save (markup.render_many).
+    """
+    tags = get_tags(post.tag_names)
+    PostTag.objects.filter(post=post).exclude(
+        tag_id__in=[tag.id for tag in tags.values()]).delete()
+    PostTag.objects.bulk_create([
+        PostTag(post=post, tag=tag, pub_date=post.pub_date)
+        for tag in tags.values()
+    ], ignore_conflicts=True)
+    Mention.objects.filter(post=post, comment=None).delete()
+    Mention.objects.bulk_create([
+        Mention(user_id=user_id, post=post)
+        for user_id in post.mentioned_ids if user_id != post.author_id
+    ])
+
+
+def index_comments(comments):
+    """
+    Записывает упоминания из комментариев. Комментарии из пачки
+    очереди сохранены без id, они находятся по ключу token.
+    """
+    comments = [comment for comment in comments if comment.mentioned_ids]
+    missing = [comment.token for comment in comments if comment.pk is None]
+    if missing:
+        ids = dict(Comment.objects.filter(token__in=missing).values_list(
+            'token', 'id'))
+        for comment in comments:
+            if comment.pk is None:
+                comment.pk = ids.get(comment.token)
+    Mention.objects.bulk_create([
+        Mention(user_id=user_id, post_id=comment.post_id,
+                comment_id=comment.pk)
+        for comment in comments if comment.pk is not None
+        for user_id in comment.mentioned_ids
+        if user_id != comment.author_id
+    ], ignore_conflicts=True)
@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..compression import ZLIB, decode, encode
+from ..models import Post, User
+
+LONG_TEXT = 'Длинная запись о путешествии по горам. ' * 100
+
+
+def stored_text(post, column='text'):
+    """Значение столбца записи как оно лежит в БД."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {column} FROM posts_post WHERE id = %s',
+                       [post.id])
+        return cursor.fetchone()[0]
+
+
+def text_updates(queries):
+    return [query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "posts_post"')
+            and ('"text" =' in query['sql']
+                 or '"text_html" =' in query['sql'])]
+
+
+@override_settings(POST_TEXT_COMPRESS_MIN_SIZE=1024)
+class CompressionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    def test_encode_frames_long_texts_only(self):
+        self.assertEqual(encode('Короткий текст'), 'Короткий текст')
+        value = encode(LONG_TEXT)
+        self.assertEqual(value[0], ZLIB)
+        self.assertLess(len(value), len(LONG_TEXT.encode()) // 10)
+        self.assertEqual(decode(value), LONG_TEXT)
+        self.assertEqual(decode(memoryview(value)), LONG_TEXT)
+
+    @override_settings(POST_TEXT_COMPRESS_MIN_SIZE=1)
+    def test_incompressible_text_stays_raw(self):
+        self.assertEqual(encode('ab'), 'ab')
+
+    @override_settings(POST_TEXT_COMPRESSION=True)
+    def test_post_text_compressed_transparently(self):
+        post = Post.objects.create(author=self.author, text=LONG_TEXT)
+        short = Post.objects.create(author=self.author, text='Коротко')
+        self.assertIsInstance(stored_text(post), bytes)
+        self.assertEqual(stored_text(short), 'Коротко')
+        loaded = Post.objects.get(id=post.id)
+        self.assertEqual(loaded.text, LONG_TEXT)
+        self.assertIn('путешествии по горам', loaded.text_html)
+        self.assertIsInstance(stored_text(post, 'text_html'), bytes)
+        shown = Post.objects.for_list().get(id=post.id)
+        self.assertEqual(shown.text, LONG_TEXT)
+
+    @override_settings(POST_TEXT_COMPRESSION=True)
+    def test_unchanged_text_not_rewritten(self):
+        post = Post.objects.create(author=self.author, text=LONG_TEXT)
+        loaded = Post.objects.get(id=post.id)
+        loaded.group = None
+        with CaptureQueriesContext(connection) as queries:
+            loaded.save()
+        self.assertEqual(text_updates(queries), [])
+        self.assertIsInstance(stored_text(post), bytes)
+
+        loaded.text = LONG_TEXT + 'Ещё абзац.'
+        with CaptureQueriesContext(connection) as queries:
+            loaded.save(update_fields=['text'])
+        # Обычный текст для сигналов и сжатый следом, HTML не трогаем.
+        self.assertEqual(len(text_updates(queries)), 2)
+        self.assertEqual(Post.objects.get(id=post.id).text,
+                         LONG_TEXT + 'Ещё абзац.')
+        self.assertIsInstance(stored_text(post), bytes)
+
+    def test_command_rewrites_existing_rows(self):
+        post = Post.objects.create(author=self.author, text=LONG_TEXT)
+        short = Post.objects.create(author=self.author, text='Коротко')
+        self.assertEqual(stored_text(post), LONG_TEXT)
+        out = StringIO()
+        with override_settings(POST_TEXT_COMPRESSION=True):
+            call_command('compress_texts', chunk_size=1, stdout=out)
+        self.assertIn('Записей: 2, переписано: 1', out.getvalue())
+        self.assertIsInstance(stored_text(post), bytes)
+        self.assertIsInstance(stored_text(post, 'text_html'), bytes)
+        self.assertEqual(stored_text(short), 'Коротко')
+        self.assertEqual(Post.objects.get(id=post.id).text, LONG_TEXT)
+        call_command('compress_texts', stdout=StringIO())
+        self.assertEqual(stored_text(post), LONG_TEXT)
+
+    def test_benchmark_reports_levels(self):
+        Post.objects.create(author=self.author, text=LONG_TEXT)
+        out = StringIO()
+        call_command('bench_compression', levels=[1, 9], repeat=1,
+                     stdout=out)
+        self.assertIn('Уровень 1:', out.getvalue())
+        self.assertIn('Уровень 9:', out.getvalue())
+        self.assertIn('сжато значений: 2', out.getvalue())
@@ -0,0 +1,96 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..counters import flush_views, view_counter, views_of
+from ..models import Post, User
+
+
+@override_settings(VIEW_PUSH_SIZE=1, VIEW_FLUSH_INTERVAL=60,
+                   VIEW_FLUSH_GRACE=0)
+class ViewCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='leo')
+        cls.posts = [Post.objects.create(author=cls.author, text=f'Пост {i}')
+                     for i in range(3)]
+
+    def setUp(self):
+        view_counter.push()
+        cache.clear()
+        self.client = Client()
+
+    def view(self, post, times=1):
+        for _ in range(times):
+            response = self.client.get(reverse(
+                'posts:post_detail', kwargs={'post_id': post.id}))
+        return response
+
+    def test_views_reach_db_in_batches(self):
+        """Просмотры копятся в кэше, страница показывает их сразу"""
+        post = self.posts[0]
+        # Первый просмотр занимает интервал и отставляет своё поколение,
+        # в БД оно попадёт только со следующим сбросом.
+        self.view(post)
+        response = self.view(post, 2)
+        self.assertEqual(response.context['views'], 3)
+        post.refresh_from_db()
+        self.assertEqual(post.views, 0)
+        call_command('flush_views', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.views, 3)
+
+    def test_flush_groups_updates_by_increment(self):
+        """Записи с одинаковым приростом обновляются одним запросом"""
+        cache.add('views:flush-lock', 1, 60)
+        self.view(self.posts[0], 2)
+        self.view(self.posts[1], 2)
+        self.view(self.posts[2])
+        self.assertEqual(flush_views(), 0)
+        with self.assertNumQueries(4):
+            self.assertEqual(flush_views(), 3)
+        self.assertEqual(
+            list(Post.objects.order_by('id').values_list('views', flat=True)),
+            [2, 2, 1])
+        self.assertEqual(flush_views(), 0)
+
+    @override_settings(VIEW_PUSH_SIZE=10, VIEW_PUSH_INTERVAL=60)
+    def test_views_buffered_in_process(self):
+        """До переноса в кэш просмотры видны из буфера процесса"""
+        response = self.view(self.posts[0], 3)
+        self.assertEqual(response.context['views'], 3)
+        self.assertEqual(flush_views(), 0)
+        # Перенос в кэш занимает свободный интервал, но свежее поколение
+        # дописывается в БД только следующим сбросом.
+        view_counter.push()
+        self.assertEqual(views_of(self.posts[0]), 3)
+        flush_views()
+        self.posts[0].refresh_from_db()
+        self.assertEqual(self.posts[0].views, 3)
+
+    def test_late_push_kept_for_next_flush(self):
+        """Запись в только что отставленное поколение не теряется"""
+        cache.add('views:flush-lock', 1, 60)
+        generation = cache.get('views:generation', 1)
+        flush_views()
+        # Процесс прочитал номер поколения до переключения.
+        with mock.patch('posts.counters._generation',
+                        return_value=generation):
+            self.view(self.posts[1], 2)
+        self.assertEqual(flush_views(), 1)
+        self.posts[1].refresh_from_db()
+        self.assertEqual(self.posts[1].views, 2)
+
+    def test_edit_keeps_flushed_views(self):
+        """Правка записи не затирает просмотры, сброшенные после загрузки"""
+        post = Post.objects.get(id=self.posts[0].id)
+        Post.objects.filter(id=post.id).update(views=5)
+        post.text = 'Правка'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual((post.text, post.views), ('Правка', 5))
@@ -0,0 +1,60 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+
+from ..duplicates import find_duplicate, minhash, minhash_many
+from ..models import Post, SignatureBand, User
+
+SPAM = ('Только сегодня и только у нас лучшие курсы программирования '
+        'на питоне со скидкой девяносто процентов переходите по ссылке '
+        'в профиле и получите подарок каждый участник получит сертификат')
+
+
+class DuplicateTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.spammer = User.objects.create_user(username='spammer')
+        cls.other = User.objects.create_user(username='other')
+        cls.post = Post.objects.create(author=cls.spammer, text=SPAM)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.other)
+
+    def test_batch_signatures_match_single(self):
+        """Подписи пачкой numpy совпадают с подписями по одной"""
+        texts = [SPAM, SPAM.upper() + '!!!', 'Коротко', '']
+        self.assertEqual(minhash_many(texts),
+                         [minhash(text) for text in texts])
+        self.assertEqual(minhash(texts[0]), minhash(texts[1]))
+        self.assertIsNone(minhash(texts[2]))
+
+    def test_near_duplicate_rejected(self):
+        """Почти такая же запись другого автора не публикуется"""
+        variant = SPAM.replace('сегодня', 'сейчас') + ' спешите'
+        with self.assertNumQueries(1):
+            self.assertEqual(find_duplicate(variant), self.post.id)
+        response = self.client.post('/create/', {'text': variant})
+        self.assertFormError(response, 'form', 'text',
+                             'Почти такая же запись уже опубликована')
+        self.assertEqual(Post.objects.count(), 1)
+        self.client.post('/create/', {
+            'text': 'Совсем другой текст о погоде в городе и прогулках '
+                    'по набережной вечером с друзьями и собакой'})
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_edit_does_not_match_itself(self):
+        self.client.force_login(self.spammer)
+        self.client.post(f'/posts/{self.post.id}/edit/',
+                         {'text': SPAM + ' спешите'})
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.text.endswith('спешите'))
+
+    def test_backfill_command(self):
+        SignatureBand.objects.all().delete()
+        call_command('build_signatures', stdout=StringIO())
+        self.assertEqual(SignatureBand.objects.filter(
+            post=self.post).count(), 16)
+        self.assertEqual(find_duplicate(SPAM), self.post.id)
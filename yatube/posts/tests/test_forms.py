@@ -4,6 +4,7 @@ from ..models import Group, Post, User
 from http import HTTPStatus
 from django.conf import settings
 import tempfile
+import hashlib
 import shutil
 from django.core.files.uploadedfile import SimpleUploadedFile
 
@@ -119,4 +120,6 @@ class TaskCreateForm(TestCase):
         self.assertEqual(post.text, 'Текст с картинкой')
         self.assertEqual(author.username, 'leo')
         self.assertEqual(group.title, 'wwork')
-        self.assertTrue(Post.objects.filter(image='posts/small.gif').exists())
+        digest = hashlib.sha256(small_gif).hexdigest()
+        self.assertTrue(Post.objects.filter(
+            image=f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif').exists())
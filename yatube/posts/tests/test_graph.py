@@ -0,0 +1,305 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase, TransactionTestCase
+from django.test import override_settings
+from django.urls import reverse
+
+from .. import graph
+from ..models import (Comment, Follow, Group, GroupSubscription, Mute, Post,
+                      SuggestionRefresh, User)
+
+
+class FollowGraphTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader')
+        self.authors = [User.objects.create_user(username=f'author{i}')
+                        for i in range(3)]
+        Follow.objects.create(user=self.user, author=self.authors[2])
+        Follow.objects.create(user=self.user, author=self.authors[0])
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_answers_from_cache(self):
+        """После первой загрузки граф отвечает без запросов к БД"""
+        self.assertEqual(list(graph.following(self.user.id)),
+                         sorted([self.authors[0].id, self.authors[2].id]))
+        with self.assertNumQueries(1):
+            self.assertEqual(graph.followers_count(self.authors[0].id), 1)
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                graph.is_following(self.user.id, self.authors[2].id))
+            self.assertFalse(
+                graph.is_following(self.user.id, self.authors[1].id))
+            self.assertEqual(graph.followers_count(self.authors[0].id), 1)
+        self.assertFalse(graph.is_following(None, self.authors[0].id))
+
+    def test_follow_and_unfollow_update_graph(self):
+        """Подписка и отписка сбрасывают массивы обоих концов"""
+        author = self.authors[1]
+        graph.following(self.user.id)
+        graph.followers(author.id)
+        self.client.get(reverse(
+            'posts:profile_follow', kwargs={'username': author.username}))
+        with self.assertNumQueries(2):
+            self.assertTrue(graph.is_following(self.user.id, author.id))
+            self.assertEqual(graph.followers_count(author.id), 1)
+        self.client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': author.username}))
+        with self.assertNumQueries(2):
+            self.assertFalse(graph.is_following(self.user.id, author.id))
+            self.assertEqual(graph.followers_count(author.id), 0)
+        self.assertFalse(
+            Follow.objects.filter(user=self.user, author=author).exists())
+
+    def test_stale_cache_does_not_block_follow_changes(self):
+        """Подписка и отписка не полагаются на кэш графа"""
+        author = self.authors[0]
+        version = graph.cache_version(graph.VERSION_KEY.format(self.user.id))
+        cache.set(graph.FOLLOWING_KEY.format(self.user.id, version), b'')
+        self.client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': author.username}))
+        self.assertFalse(
+            Follow.objects.filter(user=self.user, author=author).exists())
+        self.client.get(reverse(
+            'posts:profile_follow', kwargs={'username': author.username}))
+        self.client.get(reverse(
+            'posts:profile_follow', kwargs={'username': author.username}))
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=author).count(), 1)
+        self.assertTrue(graph.is_following(self.user.id, author.id))
+
+    def test_late_load_does_not_hide_new_follow(self):
+        """Массив, прочитанный до подписки и записанный после, не читается"""
+        author = self.authors[1]
+        user_id = self.user.id
+
+        class LateReader:
+            def order_by(self, column):
+                return self
+
+            def values_list(self, column, flat):
+                ids = list(Follow.objects.filter(user_id=user_id).values_list(
+                    column, flat=True))
+                # Подписка успевает закоммититься до записи в кэш.
+                graph.follow(user_id, author.id)
+                return ids
+
+        stale = graph._load(graph.FOLLOWING_KEY, user_id, LateReader(),
+                            'author_id')
+        self.assertFalse(graph.contains(stale, author.id))
+        self.assertTrue(graph.is_following(user_id, author.id))
+
+    def test_feed_cards_show_follow_state(self):
+        """Карточки знают, подписан ли читатель на автора"""
+        followed = Post.objects.create(author=self.authors[0], text='Да')
+        other = Post.objects.create(author=self.authors[1], text='Нет')
+        response = self.client.get(reverse('posts:index'))
+        state = {post.id: post.author_followed
+                 for post in response.context['page_obj']}
+        self.assertEqual(state, {followed.id: True, other.id: False})
+
+
+class FollowCommandsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [User.objects.create_user(username=f'user{i}')
+                     for i in range(4)]
+
+    def import_follows(self, content, suffix, *args):
+        with tempfile.NamedTemporaryFile(
+                'w', suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command('import_follows', f.name, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_skips_duplicates_and_unknown(self):
+        """Импорт пропускает дубли, подписки на себя и неизвестных"""
+        a, b, c, _ = self.users
+        Follow.objects.create(user=a, author=b)
+        rows = [(a.id, b.id), (a.id, c.id), (b.id, b.id), (c.id, 999)]
+        out = self.import_follows(
+            'user_id,author_id\n'
+            + ''.join(f'{user},{author}\n' for user, author in rows), '.csv')
+        self.assertIn('Обработано: 4, пропущено: 2', out)
+        self.assertEqual(
+            set(Follow.objects.values_list('user_id', 'author_id')),
+            {(a.id, b.id), (a.id, c.id)})
+        self.assertTrue(
+            SuggestionRefresh.objects.filter(user_id=a.id).exists())
+
+    def test_import_reports_failing_line(self):
+        """Ошибка указывает строку файла с неверной записью"""
+        a, b, c, _ = self.users
+        with self.assertRaisesMessage(CommandError, 'Ошибка в строке 4'):
+            self.import_follows(
+                f'user_id,author_id\n{a.id},{b.id}\n{a.id},{c.id}\n'
+                f'x,{b.id}\n', '.csv', '--batch-size=1')
+        with self.assertRaisesMessage(CommandError, 'Ошибка в строке 3'):
+            self.import_follows(
+                f'{{"user_id": {a.id}, "author_id": {b.id}}}\n\n'
+                f'{{"user_id": {a.id}}}\n', '.jsonl')
+
+    def test_export_import_round_trip(self):
+        """Выгрузка по именам загружается обратно без потерь"""
+        a, b, c, d = self.users
+        Follow.objects.create(user=a, author=b)
+        Follow.objects.create(user=c, author=d)
+        out = StringIO()
+        call_command('export_follows', '--format=jsonl', '--usernames',
+                     stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(json.loads(lines[0]),
+                         {'user': 'user0', 'author': 'user1'})
+        Follow.objects.all().delete()
+        self.import_follows(out.getvalue(), '.jsonl', '--usernames')
+        self.assertEqual(
+            set(Follow.objects.values_list('user_id', 'author_id')),
+            {(a.id, b.id), (c.id, d.id)})
+
+
+@override_settings(NUM_FOLLOWS=2)
+class FollowListTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.readers = [User.objects.create_user(username=f'reader{i}')
+                       for i in range(3)]
+        Follow.objects.bulk_create(
+            [Follow(user=reader, author=cls.author) for reader in cls.readers]
+            + [Follow(user=cls.author, author=cls.readers[1])])
+
+    def test_followers_pages(self):
+        """Подписчики выводятся страницами по курсору с отметкой взаимности"""
+        client = Client()
+        client.force_login(self.author)
+        url = reverse('posts:profile_followers',
+                      kwargs={'username': 'author'})
+        response = client.get(url)
+        self.assertEqual(response.context['users'], self.readers[:2])
+        self.assertEqual([user.followed for user in response.context['users']],
+                         [False, True])
+        response = client.get(url, {'cursor': response.context['next_cursor']})
+        self.assertEqual(response.context['users'], self.readers[2:])
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_following_page(self):
+        response = Client().get(reverse(
+            'posts:profile_following', kwargs={'username': 'author'}))
+        self.assertEqual(response.context['users'], [self.readers[1]])
+        response = Client().get(reverse(
+            'posts:profile_following', kwargs={'username': 'author'}),
+            {'cursor': 'x'})
+        self.assertEqual(response.status_code, 404)
+        response = Client().get(reverse(
+            'posts:profile_following', kwargs={'username': 'author'}),
+            {'cursor': '9' * 30})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(NUM_POSTS=3, MUTE_OVERFETCH=2)
+class MuteTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.noisy = User.objects.create_user(username='noisy')
+        cls.other = User.objects.create_user(username='other')
+        cls.posts = [
+            Post.objects.create(author=author, text=f'Пост {i}')
+            for i, author in enumerate(
+                [cls.other, cls.other, cls.noisy, cls.other, cls.noisy])
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_mute_hides_author_and_fills_page(self):
+        """Скрытый автор пропадает из ленты, страница добирается запасом"""
+        self.client.get(reverse(
+            'posts:profile_mute', kwargs={'username': 'noisy'}))
+        self.assertTrue(
+            Mute.objects.filter(user=self.reader, author=self.noisy).exists())
+        response = Client().get(reverse('posts:index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         self.posts[::-1][:3])
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.posts[3], self.posts[1], self.posts[0]])
+
+    def test_mute_hides_comments(self):
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.noisy, text='Шум')
+        Comment.objects.create(post=post, author=self.other, text='Дело')
+        Mute.objects.create(user=self.reader, author=self.noisy)
+        response = self.client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertEqual([comment.text for comment in
+                          response.context['comments']], ['Дело'])
+        self.client.get(reverse(
+            'posts:profile_unmute', kwargs={'username': 'noisy'}))
+        response = self.client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertEqual(len(response.context['comments']), 2)
+
+
+@override_settings(NUM_POSTS=3)
+class GroupSubscriptionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(author=cls.author, text='Автор'),
+            Post.objects.create(author=cls.stranger, text='Чужой'),
+            Post.objects.create(author=cls.stranger, group=cls.group,
+                                text='Группа'),
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text='Автор в группе'),
+            Post.objects.create(author=cls.author, text='Снова автор'),
+        ]
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_merged_feed(self):
+        """Лента подписок объединяет авторов и группы без дублей"""
+        self.client.get(reverse(
+            'posts:group_subscribe', kwargs={'slug': 'group'}))
+        self.assertTrue(GroupSubscription.objects.filter(
+            user=self.reader, group=self.group).exists())
+        url = reverse('posts:follow_index')
+        expected = [self.posts[4], self.posts[3], self.posts[2],
+                    self.posts[0]]
+        response = self.client.get(url)
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, 4)
+        self.assertEqual(list(page), expected[:3])
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(list(response.context['page_obj']), expected[3:])
+
+    def test_unsubscribe(self):
+        GroupSubscription.objects.create(user=self.reader, group=self.group)
+        self.client.get(reverse(
+            'posts:group_unsubscribe', kwargs={'slug': 'group'}))
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 3)
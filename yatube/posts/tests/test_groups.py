@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, GroupStats, Post
+
+User = get_user_model()
+
+
+class GroupStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.leo = User.objects.create_user(username='leo')
+        cls.ann = User.objects.create_user(username='ann')
+        cls.quiet = Group.objects.create(title='Тихая', slug='quiet')
+        cls.busy = Group.objects.create(title='Шумная', slug='busy')
+
+    def stats(self, group):
+        stats = GroupStats.objects.get(group=group)
+        return stats.posts_count, stats.authors_count, stats.last_post_date
+
+    def test_stats_follow_posts(self):
+        """Сводка меняется при создании, переносе и удалении записей"""
+        first = Post.objects.create(author=self.leo, group=self.busy,
+                                    text='Первая')
+        second = Post.objects.create(author=self.ann, group=self.busy,
+                                     text='Вторая')
+        Post.objects.create(author=self.leo, group=self.busy, text='Третья')
+        third = Post.objects.latest('pub_date')
+        self.assertEqual(self.stats(self.busy), (3, 2, third.pub_date))
+
+        moved = Post.objects.get(pk=third.pk)
+        moved.group = self.quiet
+        moved.save()
+        self.assertEqual(self.stats(self.busy), (2, 2, second.pub_date))
+        self.assertEqual(self.stats(self.quiet), (1, 1, third.pub_date))
+
+        second.delete()
+        self.assertEqual(self.stats(self.busy), (1, 1, first.pub_date))
+
+    def test_admin_list_editable_moves_post(self):
+        """Смена группы в списке админки тоже обновляет сводку"""
+        post = Post.objects.create(author=self.leo, group=self.busy,
+                                   text='Текст')
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        client = Client()
+        client.force_login(admin)
+        client.post(reverse('admin:posts_post_changelist'), {
+            'form-TOTAL_FORMS': 1,
+            'form-INITIAL_FORMS': 1,
+            'form-0-id': post.pk,
+            'form-0-group': self.quiet.pk,
+            '_save': 'Сохранить',
+        })
+        self.assertEqual(self.stats(self.busy)[:2], (0, 0))
+        self.assertEqual(self.stats(self.quiet)[:2], (1, 1))
+
+    def test_directory_sorted_by_activity(self):
+        """Каталог групп собирается одним запросом и сортируется"""
+        Post.objects.create(author=self.leo, group=self.quiet, text='Раньше')
+        Post.objects.create(author=self.leo, group=self.busy, text='Позже')
+        Post.objects.create(author=self.ann, group=self.busy, text='Ещё')
+        empty = Group.objects.create(title='Пустая', slug='empty')
+        client = Client()
+        with self.assertNumQueries(2):
+            response = client.get(reverse('posts:groups_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.busy, self.quiet, empty])
+        response = client.get(reverse('posts:groups_index'),
+                              {'sort': 'authors'})
+        self.assertEqual(list(response.context['page_obj'])[0], self.busy)
+
+    def test_directory_pages_keep_sort(self):
+        """Ссылки на страницы каталога сохраняют выбранную сортировку"""
+        Group.objects.bulk_create(
+            [Group(title=f'Группа {i}', slug=f'group-{i}')
+             for i in range(settings.NUM_GROUPS)])
+        response = Client().get(reverse('posts:groups_index'),
+                                {'sort': 'posts'})
+        self.assertContains(response, 'href="?sort=posts&amp;page=2"')
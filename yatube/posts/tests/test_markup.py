@@ -0,0 +1,185 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..markup import EXCERPT_LENGTH, render_many, to_excerpt, to_html
+from ..models import Comment, Mention, Post, PostTag, User
+
+TEMP_SPOOL_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class MarkupTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.leo = User.objects.create_user(username='leo')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_SPOOL_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_render_resolves_names_in_one_query(self):
+        """Имена из всех текстов разрешаются одним запросом"""
+        posts = [Post(text='<b>@leo</b>, пишите на a@leo.ru'),
+                 Post(text='@ghost и @leo. #Котики #'),
+                 Post(text='без ссылок')]
+        with self.assertNumQueries(1):
+            render_many(posts)
+        profile = reverse('posts:profile', args=['leo'])
+        self.assertEqual(
+            posts[0].text_html,
+            f'<p>&lt;b&gt;<a href="{profile}">@leo</a>&lt;/b&gt;, '
+            'пишите на a@leo.ru</p>')
+        self.assertIn('@ghost и ', posts[1].text_html)
+        self.assertIn(f'<a href="{profile}">@leo</a>.', posts[1].text_html)
+        self.assertIn(
+            f'<a href="{reverse("posts:tag_posts", args=["котики"])}">'
+            '#Котики</a>', posts[1].text_html)
+        self.assertEqual(posts[1].mentioned_ids, [self.leo.id])
+        with self.assertNumQueries(0):
+            render_many(posts[2:])
+
+    def test_rich_text(self):
+        """Абзацы, ссылки и разметка; остальной HTML экранируется"""
+        html = to_html(
+            'Первая строка\nвторая **жирно** и *курсив*\n\n'
+            '`<script>` https://example.com/a?b=1&c=2. 2 * 3 * 4 '
+            'javascript:alert(1)', {})
+        self.assertEqual(
+            html,
+            '<p>Первая строка<br>вторая <strong>жирно</strong> и '
+            '<em>курсив</em></p>'
+            '<p><code>&lt;script&gt;</code> '
+            '<a href="https://example.com/a?b=1&amp;c=2" rel="nofollow">'
+            'https://example.com/a?b=1&amp;c=2</a>. 2 * 3 * 4 '
+            'javascript:alert(1)</p>')
+
+    def test_excerpt(self):
+        self.assertEqual(to_excerpt('Строка\n\n**жирно**  и `код`'),
+                         'Строка жирно и код')
+        excerpt = to_excerpt('слово ' * 100)
+        self.assertLessEqual(len(excerpt), EXCERPT_LENGTH)
+        self.assertTrue(excerpt.endswith('слово…'))
+
+    def test_card_shows_excerpts(self):
+        """Карточка выводит выдержки записи и комментариев"""
+        post = Post.objects.create(author=self.author,
+                                   text='Абзац\n\n**Второй**')
+        Comment.objects.create(post=post, author=self.leo,
+                               text='Длинный ' * 60)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<p>Абзац Второй</p>')
+        comment = response.context['page_obj'][0].latest_comments[0]
+        self.assertTrue(comment.excerpt.endswith('…'))
+        self.assertContains(response, comment.excerpt)
+
+    def test_list_pages_defer_text(self):
+        """Ленты и админка не загружают полный текст записей"""
+        post = Post.objects.create(author=self.author,
+                                   text='#длинный ' + 'Текст ' * 500)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:tag_posts', args=['длинный']),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                for shown in response.context['page_obj']:
+                    self.assertIn('text', shown.get_deferred_fields())
+                    self.assertEqual(shown.excerpt, post.excerpt)
+        self.author.is_staff = self.author.is_superuser = True
+        self.author.save()
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertContains(response, post.excerpt[:50])
+        self.assertTrue(
+            response.context['cl'].result_list[0].get_deferred_fields())
+
+    def test_admin_list_queries_do_not_grow(self):
+        """Число запросов списка админки не зависит от числа записей"""
+        self.author.is_staff = self.author.is_superuser = True
+        self.author.save()
+        url = reverse('admin:posts_post_changelist')
+        Post.objects.create(author=self.author, text='Текст')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        Post.objects.bulk_create(
+            [Post(author=self.author, text=f'Текст {i}') for i in range(10)])
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['cl'].result_list), 11)
+
+    def test_deferred_post_saved_without_text(self):
+        """Запись из списка сохраняется, не трогая текст и HTML"""
+        post = Post.objects.create(author=self.author, text='Текст #тег')
+        shown = Post.objects.for_list().get(id=post.id)
+        with self.assertNumQueries(1):
+            shown.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Текст #тег')
+        self.assertIn('#тег</a>', post.text_html)
+        self.assertEqual(post.excerpt, 'Текст #тег')
+
+    def test_post_indexed_and_tag_feed(self):
+        """Теги записи попадают в индекс и ленту тега"""
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Привет, @leo! #django #Django #котики'})
+        post = Post.objects.get()
+        self.assertEqual(
+            sorted(PostTag.objects.values_list('tag__name', flat=True)),
+            ['django', 'котики'])
+        self.assertTrue(Mention.objects.filter(
+            user=self.leo, post=post, comment=None).exists())
+        other = Post.objects.create(author=self.leo, text='#django тоже')
+        response = self.client.get(
+            reverse('posts:tag_posts', args=['Django']))
+        self.assertEqual(list(response.context['page_obj']), [other, post])
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, 'href="/profile/leo/"')
+
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            {'text': 'Только #котики'})
+        self.assertEqual(
+            list(post.tag_links.values_list('tag__name', flat=True)),
+            ['котики'])
+        self.assertFalse(Mention.objects.filter(post=post).exists())
+
+    @override_settings(SPOOL_ROOT=TEMP_SPOOL_ROOT, COMMENT_BATCH_SIZE=2,
+                       COMMENT_FLUSH_INTERVAL=60)
+    def test_queued_comments_index_mentions(self):
+        """Упоминания в комментариях из очереди попадают в индекс"""
+        post = Post.objects.create(author=self.leo, text='Запись')
+        url = reverse('posts:add_comment', kwargs={'post_id': post.id})
+        self.client.post(url, {'text': 'Согласен с @leo'})
+        self.client.post(url, {'text': 'И с @author тоже'})
+        comment = Comment.objects.get(text='Согласен с @leo')
+        self.assertIn('href="/profile/leo/"', comment.text_html)
+        self.assertEqual(
+            list(Mention.objects.values_list('user', 'comment')),
+            [(self.leo.id, comment.id)])
+
+    def test_index_command_fills_old_texts(self):
+        post = Post.objects.create(author=self.author, text='#старое @leo')
+        Post.objects.filter(id=post.id).update(text_html='')
+        PostTag.objects.all().delete()
+        call_command('render_text', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertIn('#старое</a>', post.text_html)
+        self.assertTrue(PostTag.objects.filter(post=post).exists())
@@ -0,0 +1,117 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from ..models import Mute, Notification, Post, User
+from ..notifications import unread_count, write_events
+
+TEMP_SPOOL_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(SPOOL_ROOT=TEMP_SPOOL_ROOT, NOTIFY_BATCH_SIZE=3,
+                   NOTIFY_FLUSH_INTERVAL=60)
+class NotificationTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_SPOOL_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='Запись')
+        self.readers = [User.objects.create_user(username=f'reader{i}')
+                        for i in range(3)]
+
+    def tearDown(self):
+        cache.clear()
+
+    def client_for(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def comment(self, user):
+        self.client_for(user).post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Комментарий'})
+
+    def test_events_coalesced_per_recipient(self):
+        """Пачка комментариев к записи даёт одно уведомление"""
+        self.comment(self.readers[0])
+        self.comment(self.readers[1])
+        self.assertFalse(Notification.objects.exists())
+        self.comment(self.readers[2])
+        self.comment(self.readers[0])
+        call_command('flush_notifications', stdout=StringIO())
+        notification = Notification.objects.get()
+        self.assertEqual(notification.count, 4)
+        self.assertEqual(notification.actor, self.readers[0])
+        self.assertEqual(unread_count(self.author), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.author), 1)
+
+    def test_parallel_insert_keeps_events(self):
+        """События не теряются, если строку успел создать другой запуск"""
+        real_update = Notification.objects.bulk_update
+
+        def parallel_insert(*args, **kwargs):
+            # Параллельная пачка вставляет строку после нашего поиска.
+            Notification.objects.create(
+                recipient=self.author, key=f'comment:{self.post.id}',
+                kind=Notification.COMMENT, post=self.post,
+                actor=self.readers[2], count=1, seq=1)
+            return real_update(*args, **kwargs)
+
+        with mock.patch.object(Notification.objects, 'bulk_update',
+                               side_effect=parallel_insert):
+            write_events([{'kind': Notification.COMMENT,
+                           'post': self.post.id, 'actor': reader.id}
+                          for reader in self.readers[:2]])
+        notification = Notification.objects.get()
+        self.assertEqual(notification.count, 3)
+        self.assertEqual(notification.actor, self.readers[1])
+
+    def test_inbox_marks_read_and_paginates(self):
+        """Ящик листается курсором, прочитанные больше не копят события"""
+        self.client_for(self.readers[0]).get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}))
+        # Свои комментарии и комментарии скрытых авторов не уведомляют.
+        Mute.objects.create(user=self.author, author=self.readers[1])
+        self.comment(self.author)
+        self.comment(self.readers[1])
+        self.comment(self.readers[2])
+        call_command('flush_notifications', stdout=StringIO())
+        self.assertEqual(Notification.objects.count(), 2)
+
+        client = self.client_for(self.author)
+        with override_settings(NUM_NOTIFICATIONS=1):
+            response = client.get(reverse('posts:notifications'))
+            first = response.context['notifications']
+            self.assertEqual([n.kind for n in first], ['comment'])
+            self.assertFalse(first[0].read)
+            response = client.get(reverse('posts:notifications'), {
+                'cursor': response.context['next_cursor']})
+            self.assertEqual(
+                [n.kind for n in response.context['notifications']],
+                ['follow'])
+            self.assertIsNone(response.context['next_cursor'])
+        self.assertEqual(unread_count(self.author), 0)
+        self.assertEqual(client.get(
+            reverse('posts:notifications'), {'cursor': 'x'}).status_code, 404)
+        self.assertEqual(client.get(
+            reverse('posts:notifications'),
+            {'cursor': '9' * 30}).status_code, 404)
+
+        self.comment(self.readers[2])
+        call_command('flush_notifications', stdout=StringIO())
+        self.assertEqual(Notification.objects.filter(
+            kind=Notification.COMMENT).count(), 2)
+        self.assertEqual(unread_count(self.author), 1)
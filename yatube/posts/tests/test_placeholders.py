@@ -0,0 +1,63 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def get_image_file(name, color=(255, 0, 0)):
+    file_obj = BytesIO()
+    Image.new('RGB', size=(80, 50), color=color).save(file_obj, 'png')
+    return SimpleUploadedFile(name, file_obj.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PlaceholderTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='leo')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        cache.clear()
+
+    def test_placeholder_computed_on_upload(self):
+        """При загрузке картинки сохраняются цвет и размытое превью"""
+        self.authorized_client.post(reverse('posts:post_create'), data={
+            'text': 'Текст',
+            'image': get_image_file('red.png'),
+        })
+        post = Post.objects.get()
+        self.assertEqual(post.placeholder_color, '#ff0000')
+        self.assertTrue(post.placeholder.startswith('data:image/png;base64,'))
+        self.assertLess(len(post.placeholder), 1024)
+
+    def test_placeholder_cleared_without_image(self):
+        """Пост без картинки не хранит превью"""
+        post = Post.objects.create(author=self.author, text='Текст')
+        self.assertEqual(post.placeholder_color, '')
+        self.assertEqual(post.placeholder, '')
+
+    def test_feed_inlines_placeholder(self):
+        """Карточка поста встраивает превью и лениво грузит картинку"""
+        Post.objects.create(
+            author=self.author, text='Текст', image=get_image_file('a.png'))
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'data:image/png;base64,')
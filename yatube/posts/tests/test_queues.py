@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Comment, Post, User
+
+TEMP_SPOOL_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(SPOOL_ROOT=TEMP_SPOOL_ROOT, COMMENT_BATCH_SIZE=3,
+                   COMMENT_FLUSH_INTERVAL=60)
+class CommentQueueTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='leo')
+        cls.post = Post.objects.create(author=cls.author, text='Текст')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_SPOOL_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        self.url = reverse('posts:add_comment',
+                           kwargs={'post_id': self.post.id})
+
+    def test_comments_written_in_batches(self):
+        """Комментарии пишутся пачкой, автор видит ожидающие"""
+        for i in range(2):
+            response = self.authorized_client.post(
+                self.url, {'text': f'Комментарий {i}'})
+            self.assertRedirects(response, reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertEqual(Comment.objects.count(), 0)
+        response = self.authorized_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        pending = response.context['comments']
+        self.assertEqual(len(pending), 2)
+        self.assertTrue(all(comment.pk is None for comment in pending))
+
+        self.authorized_client.post(self.url, {'text': 'Комментарий 2'})
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 3)
+        response = self.authorized_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 3)
+        self.assertTrue(all(comment.pk for comment in comments))
+
+    def test_flush_command_replays_abandoned_batch(self):
+        """Брошенная пачка дописывается командой без дублей"""
+        directory = os.path.join(TEMP_SPOOL_ROOT, 'comments')
+        os.makedirs(directory, exist_ok=True)
+        item = {'token': uuid.uuid4().hex, 'post': self.post.id,
+                'author': self.author.id, 'text': 'Из очереди'}
+        for _ in range(2):
+            path = os.path.join(directory, f'batch-{uuid.uuid4().hex}.jsonl')
+            with open(path, 'w') as f:
+                f.write(json.dumps(item) + '\n')
+            call_command('flush_comments', '--stale-after=-1',
+                         stdout=StringIO())
+        self.assertEqual(Comment.objects.filter(text='Из очереди').count(), 1)
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_comment_keeps_submission_time(self):
+        """Комментарий из очереди получает время отправки, а не записи"""
+        submitted = timezone.now() - timedelta(minutes=5)
+        directory = os.path.join(TEMP_SPOOL_ROOT, 'comments')
+        os.makedirs(directory, exist_ok=True)
+        item = {'token': uuid.uuid4().hex, 'post': self.post.id,
+                'author': self.author.id, 'text': 'Старый',
+                'created': submitted.isoformat()}
+        path = os.path.join(directory, f'batch-{uuid.uuid4().hex}.jsonl')
+        with open(path, 'w') as f:
+            f.write(json.dumps(item) + '\n')
+        call_command('flush_comments', '--stale-after=-1', stdout=StringIO())
+        self.assertEqual(Comment.objects.get(text='Старый').created,
+                         submitted)
+
+    def test_queued_reply_joins_thread(self):
+        """Ответ из очереди встаёт в ветку и учитывается в счётчике"""
+        root = Comment.objects.create(
+            post=self.post, author=self.author, text='Корень')
+        for i in range(3):
+            self.authorized_client.post(
+                self.url, {'text': f'Ответ {i}', 'parent': root.id})
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 3)
+        self.assertEqual(
+            set(root.replies.values_list('depth', flat=True)), {1})
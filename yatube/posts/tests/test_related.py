@@ -0,0 +1,79 @@
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post, RelatedPost, RelatedRefresh, User
+from ..related import TextMatrix, nearest
+
+
+class RelatedPostsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='leo')
+        cls.group = Group.objects.create(title='Кошки', slug='cats')
+        texts = [
+            'Мой кот любит спать на подоконнике весь день',
+            'Кот снова спит на подоконнике и греется',
+            'Сегодня варил борщ по бабушкиному рецепту',
+            'Рецепт борща: свёкла, капуста и немного терпения',
+            'Прогулка по набережной вечером',
+        ]
+        cls.posts = [Post.objects.create(author=cls.author, text=text)
+                     for text in texts]
+
+    def test_nearest_matches_brute_force(self):
+        """Блочное умножение даёт те же соседи, что и полный перебор"""
+        matrix = TextMatrix.load()
+        size = len(matrix.ids)
+        dense = np.zeros((size, len(matrix.df)))
+        for row in range(size):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            dense[row, matrix.indices[start:end]] = matrix.data[start:end]
+        similarity = dense @ dense.T
+        owners, docs, scores = nearest(
+            matrix, np.arange(size), top_k=1, max_df=size)
+        for owner, doc, score in zip(owners, docs, scores):
+            row = similarity[owner].copy()
+            row[owner] = 0
+            self.assertEqual(doc, row.argmax())
+            self.assertAlmostEqual(score, row.max())
+
+    def test_incremental_build_and_sidebar(self):
+        """Новая запись получает похожие и попадает в списки соседей"""
+        call_command('build_related', stdout=StringIO())
+        self.assertFalse(RelatedRefresh.objects.exists())
+        cat, other_cat = self.posts[0], self.posts[1]
+        self.assertEqual(
+            list(cat.related_links.values_list('related', flat=True)),
+            [other_cat.id])
+
+        new = Post.objects.create(
+            author=self.author, group=self.group,
+            text='Кот спит на подоконнике, а я читаю')
+        self.assertTrue(RelatedRefresh.objects.filter(post_id=new.id).exists())
+        call_command('build_related', stdout=StringIO())
+        self.assertIn(new.id, RelatedPost.objects.filter(
+            post=cat).values_list('related', flat=True))
+        self.assertFalse(RelatedPost.objects.filter(
+            post=new, related=self.posts[2]).exists())
+
+        response = Client().get(
+            reverse('posts:post_detail', kwargs={'post_id': new.id}))
+        self.assertEqual(set(response.context['related_posts']),
+                         {cat, other_cat})
+
+    def test_edited_post_dropped_from_old_neighbours(self):
+        """После правки запись уходит из списков бывших соседей"""
+        call_command('build_related', stdout=StringIO())
+        cat, other_cat = self.posts[0], self.posts[1]
+        self.assertTrue(RelatedPost.objects.filter(
+            post=cat, related=other_cat).exists())
+        other_cat.text = 'Сегодня варил борщ, свёкла и капуста'
+        other_cat.save()
+        call_command('build_related', stdout=StringIO())
+        self.assertFalse(RelatedPost.objects.filter(
+            post=cat, related=other_cat).exists())
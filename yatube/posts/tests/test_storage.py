@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from io import StringIO
+from sorl.thumbnail.images import ImageFile
+
+from ..models import MediaFile, Post, User, delete_unused_media
+from ..storage import is_hashed_name, media_storage
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class HashedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='leo')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, filename):
+        return Post.objects.create(
+            author=self.author,
+            text='Текст',
+            image=SimpleUploadedFile(filename, SMALL_GIF, 'image/gif'),
+        )
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом со счётчиком ссылок"""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_hashed_name(first.image.name))
+        self.assertTrue(media_storage.exists(first.image.name))
+        self.assertEqual(MediaFile.objects.get(name=first.image.name).refs, 2)
+
+    def test_delete_post_releases_image(self):
+        """Удаление поста уменьшает счётчик ссылок на картинку"""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        first.delete()
+        self.assertEqual(MediaFile.objects.get(name=second.image.name).refs, 1)
+        second.delete()
+        self.assertFalse(
+            MediaFile.objects.filter(name=second.image.name).exists())
+
+    def test_reupload_protects_file_from_release(self):
+        """Повторная загрузка обновляет время файла, и он не удаляется"""
+        first = self.create_post('first.gif')
+        name = first.image.name
+        os.utime(media_storage.path(name), (0, 0))
+        first.delete()
+        self.create_post('second.gif')
+        self.assertFalse(delete_unused_media(name))
+        Post.objects.all().delete()
+        # Ссылок больше нет, но файл только что загружали.
+        self.assertFalse(delete_unused_media(name))
+        self.assertTrue(media_storage.exists(name))
+        os.utime(media_storage.path(name), (0, 0))
+        self.assertTrue(delete_unused_media(name))
+        self.assertFalse(media_storage.exists(name))
+
+    def test_dedupe_media_command(self):
+        """Команда dedupe_media переносит старые файлы и убирает дубли"""
+        for name in ('posts/a.gif', 'posts/b.gif'):
+            path = media_storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(SMALL_GIF)
+        first = Post.objects.create(
+            author=self.author, text='Текст', image='posts/a.gif')
+        second = Post.objects.create(
+            author=self.author, text='Текст', image='posts/b.gif')
+        call_command('dedupe_media', stdout=StringIO())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_hashed_name(first.image.name))
+        self.assertTrue(media_storage.exists(first.image.name))
+        self.assertFalse(media_storage.exists('posts/a.gif'))
+        self.assertFalse(media_storage.exists('posts/b.gif'))
+        self.assertEqual(MediaFile.objects.get(name=first.image.name).refs, 2)
+
+    def test_collect_media_removes_orphans(self):
+        """Команда collect_media удаляет только файлы без ссылок"""
+        post = self.create_post('kept.gif')
+        orphan = media_storage.path('posts/orphan.gif')
+        with open(orphan, 'wb') as f:
+            f.write(SMALL_GIF)
+        out = StringIO()
+        call_command('collect_media', '--dry-run', '--min-age=0', stdout=out)
+        self.assertTrue(os.path.exists(orphan))
+        self.assertIn(f'posts/orphan.gif ({len(SMALL_GIF)} байт)',
+                      out.getvalue())
+        call_command('collect_media', '--min-age=0', stdout=StringIO())
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(media_storage.exists(post.image.name))
+
+    def test_collect_media_skips_file_reused_during_batch(self):
+        """Файл, загруженный повторно во время сборки, не удаляется"""
+        orphan = media_storage.path('posts/orphan.gif')
+        with open(orphan, 'wb') as f:
+            f.write(SMALL_GIF)
+        os.utime(orphan, (0, 0))
+
+        def reupload(name, storage):
+            os.utime(storage.path(name))
+            return ImageFile(name, storage)
+
+        with mock.patch('posts.management.commands.collect_media.ImageFile',
+                        side_effect=reupload):
+            call_command('collect_media', '--min-age=60', stdout=StringIO())
+        self.assertTrue(os.path.exists(orphan))
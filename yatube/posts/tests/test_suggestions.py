@@ -0,0 +1,68 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import graph
+from ..suggestions import FollowMatrix
+from ..models import Follow, FollowSuggestion, SuggestionRefresh, User
+
+
+class SuggestionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.a, cls.b, cls.c = [User.objects.create_user(username=name)
+                               for name in ('a', 'b', 'c')]
+        peers = [User.objects.create_user(username=f'peer{i}')
+                 for i in range(2)]
+        edges = [(cls.reader, cls.a), (peers[0], cls.a), (peers[0], cls.b),
+                 (peers[0], cls.c), (peers[1], cls.a), (peers[1], cls.b)]
+        Follow.objects.bulk_create(
+            [Follow(user=user, author=author) for user, author in edges])
+
+    def suggested(self, user):
+        return list(FollowSuggestion.objects.filter(
+            user=user).values_list('author__username', flat=True))
+
+    def test_build_all(self):
+        """Рекомендации упорядочены по числу совместных подписок"""
+        call_command('build_suggestions', '--all', stdout=StringIO())
+        self.assertEqual(self.suggested(self.reader), ['b', 'c'])
+
+    def test_incremental_refresh(self):
+        """Пересчитываются только пользователи с изменёнными подписками"""
+        call_command('build_suggestions', '--all', stdout=StringIO())
+        graph.follow(self.reader.id, self.b.id)
+        self.assertTrue(
+            SuggestionRefresh.objects.filter(user_id=self.reader.id).exists())
+        call_command('build_suggestions', stdout=StringIO())
+        self.assertEqual(self.suggested(self.reader), ['c'])
+        self.assertFalse(SuggestionRefresh.objects.exists())
+
+    def test_follow_during_build_stays_marked(self):
+        """Подписка во время пересчёта оставляет отметку до следующего"""
+        graph.follow(self.reader.id, self.b.id)
+        load = FollowMatrix.load
+
+        def late_follow():
+            matrix = load()
+            graph.follow(self.reader.id, self.c.id)
+            return matrix
+
+        with mock.patch.object(FollowMatrix, 'load', side_effect=late_follow):
+            call_command('build_suggestions', '--all', stdout=StringIO())
+        self.assertTrue(
+            SuggestionRefresh.objects.filter(user_id=self.reader.id).exists())
+        call_command('build_suggestions', stdout=StringIO())
+        self.assertEqual(self.suggested(self.reader), [])
+
+    def test_follow_page_shows_suggestions(self):
+        call_command('build_suggestions', '--all', stdout=StringIO())
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['suggestions'], [self.b, self.c])
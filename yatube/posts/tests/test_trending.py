@@ -0,0 +1,61 @@
+import time
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import trending
+from ..models import ActivityCounter, Group, Post, User
+
+
+@override_settings(TRENDING_SIZE=2)
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='leo')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {i}',
+                                group=cls.group if i else None)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def comment(self, post, times=1):
+        for _ in range(times):
+            self.client.post(
+                reverse('posts:add_comment', kwargs={'post_id': post.id}),
+                {'text': 'Комментарий'})
+
+    def test_index_shows_trending(self):
+        """Рейтинг считается командой и читается главной из кэша"""
+        self.comment(self.posts[0], 3)
+        self.comment(self.posts[2], 2)
+        self.comment(self.posts[1])
+        call_command('build_trending', stdout=StringIO())
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            [(item['id'], item['score'])
+             for item in response.context['trending_posts']],
+            [(self.posts[0].id, 3), (self.posts[2].id, 2)])
+        self.assertEqual(response.context['trending_groups'],
+                         [{'slug': 'group', 'title': 'Группа', 'score': 3}])
+
+    def test_old_buckets_roll_over(self):
+        """Старые интервалы выпадают из часового окна и удаляются"""
+        now = time.time()
+        trending.record(trending.POST, {self.posts[0].id: 5},
+                        now=now - 2 * 60 * 60)
+        trending.record(trending.POST, {self.posts[1].id: 1}, now=now)
+        self.assertEqual(trending.top(trending.POST, 'hour', 5, now),
+                         [(self.posts[1].id, 1)])
+        self.assertEqual(len(trending.top(trending.POST, 'day', 5, now)), 2)
+        trending.build(now=now + 25 * 60 * 60)
+        self.assertFalse(ActivityCounter.objects.exists())
@@ -0,0 +1,74 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+
+from ..models import Follow, Group, GroupSubscription, Post, User
+from ..unread import unread_count
+
+
+class FeedUnreadTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=self.reader, author=self.author)
+        GroupSubscription.objects.create(user=self.reader, group=self.group)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_counter_bumped_and_reset(self):
+        """Новые записи считаются в бейдже и сбрасываются в ленте"""
+        self.client.get(reverse('posts:follow_index'))
+        old = Post.objects.create(author=self.author, text='Старая')
+        self.client.get(reverse('posts:follow_index'))
+        Post.objects.create(author=self.author, text='Автор')
+        # Запись и автора, и группы считается один раз.
+        Post.objects.create(author=self.author, text='Оба', group=self.group)
+        Post.objects.create(author=self.reader, text='Своя',
+                            group=self.group)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<span class="badge bg-danger">2</span>',
+                            count=2)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.reader), 2)
+
+        response = self.client.get(reverse('posts:follow_index'))
+        new = {post.text for post in response.context['page_obj']
+               if post.is_new}
+        self.assertEqual(new, {'Автор', 'Оба'})
+        self.assertNotIn(old.text, new)
+        self.assertNotContains(response, 'bg-danger')
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.reader), 0)
+
+    def test_no_counter_before_first_visit(self):
+        """До первого открытия ленты счётчик не ведётся"""
+        Post.objects.create(author=self.author, text='Запись')
+        self.assertEqual(unread_count(self.reader), 0)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertFalse(any(
+            post.is_new for post in response.context['page_obj']))
+
+    def test_publish_during_load_not_hidden(self):
+        """Запись, вышедшая во время чтения счётчика, не теряется"""
+        self.client.get(reverse('posts:follow_index'))
+        cache.clear()
+        real_set = cache.set
+        late = [True]
+
+        def late_set(*args, **kwargs):
+            if late:
+                late.pop()
+                # Запись успевает закоммититься до записи в кэш.
+                Post.objects.create(author=self.author, text='Поздняя')
+            return real_set(*args, **kwargs)
+
+        with mock.patch.object(cache, 'set', side_effect=late_set):
+            self.assertEqual(unread_count(self.reader), 0)
+        self.assertEqual(unread_count(self.reader), 1)
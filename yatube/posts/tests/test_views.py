@@ -6,7 +6,7 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
-from ..models import Group, Post, User, Follow
+from ..models import Group, Post, User, Follow, Comment
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -334,3 +334,155 @@ class FollowTests(TestCase):
         self.assertTrue(post_text, 'Текст для проверки')
         response = self.authorized_client_1.get('/follow/')
         self.assertNotContains(response, 'Текст для проверки')
+
+
+class CommentsPageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='leo')
+        cls.post = Post.objects.create(author=cls.author, text='Текст')
+        comments = [
+            Comment(post=cls.post, text=f'Комментарий {i}',
+                    author=User.objects.create_user(username=f'user{i}'))
+            for i in range(settings.NUM_COMMENTS + 5)
+        ]
+        for comment in comments:
+            comment.place()
+        Comment.objects.bulk_create(comments)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_post_detail_shows_first_page(self):
+        """На странице поста только первая страница комментариев"""
+        response = self.guest_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertEqual(len(response.context['comments']),
+                         settings.NUM_COMMENTS)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    def test_comments_more_returns_rest(self):
+        """По курсору приходят оставшиеся комментарии без повторов"""
+        response = self.guest_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        first_page = set(response.context['comments'])
+        response = self.guest_client.get(
+            reverse('posts:comments_more', kwargs={'post_id': self.post.id}),
+            {'cursor': response.context['next_cursor']})
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 5)
+        self.assertFalse(first_page & set(rest))
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_post_detail_query_count(self):
+        """Число запросов не зависит от числа комментариев"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        # Пост, страница комментариев, похожие записи, число постов автора.
+        with self.assertNumQueries(4):
+            self.guest_client.get(url)
+
+    def test_bad_cursor(self):
+        response = self.guest_client.get(
+            reverse('posts:comments_more', kwargs={'post_id': self.post.id}),
+            {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 404)
+        response = self.guest_client.get(
+            reverse('posts:comments_more', kwargs={'post_id': self.post.id}),
+            {'root': 'abc'})
+        self.assertEqual(response.status_code, 404)
+        response = self.guest_client.get(
+            reverse('posts:comments_more', kwargs={'post_id': self.post.id}),
+            {'root': '9' * 30})
+        self.assertEqual(response.status_code, 404)
+
+    def test_feed_cards_show_latest_comments(self):
+        """Карточки получают последние комментарии одним запросом"""
+        other = Post.objects.create(author=self.author, text='Без отзывов')
+        url = reverse('posts:profile', kwargs={'username': 'leo'})
+        # Ещё два запроса - счётчики подписок: внутри транзакции теста
+        # граф подписок не кэшируется.
+        with self.assertNumQueries(6):
+            response = self.guest_client.get(url)
+        posts = {post.id: post for post in response.context['page_obj']}
+        latest = posts[self.post.id].latest_comments
+        self.assertEqual(posts[self.post.id].comments_total,
+                         settings.NUM_COMMENTS + 5)
+        self.assertEqual(
+            [comment.id for comment in latest],
+            list(self.post.comments.order_by('-created', '-id').values_list(
+                'id', flat=True)[:settings.NUM_LATEST_COMMENTS]))
+        self.assertEqual(latest[0].author.username,
+                         self.post.comments.latest('id').author.username)
+        self.assertEqual(posts[other.id].latest_comments, [])
+        self.assertContains(response, latest[0].text)
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='leo')
+        cls.post = Post.objects.create(author=cls.author, text='Текст')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def reply(self, text, parent=None):
+        data = {'text': text}
+        if parent is not None:
+            data['parent'] = parent.id
+        self.authorized_client.post(reverse(
+            'posts:add_comment', kwargs={'post_id': self.post.id}), data)
+        return Comment.objects.get(text=text)
+
+    def test_thread_is_ordered_for_rendering(self):
+        """Ветка выводится одним списком: ответы под своим комментарием"""
+        first = self.reply('Первый')
+        answer = self.reply('Ответ', first)
+        second = self.reply('Второй')
+        nested = self.reply('Ответ на ответ', answer)
+        late = self.reply('Поздний ответ', first)
+        response = self.authorized_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertEqual(response.context['comments'],
+                         [second, first, answer, nested, late])
+        self.assertEqual([nested.depth, late.depth], [2, 1])
+        self.assertEqual(nested.parent, answer)
+
+    def test_replies_count_is_incremental(self):
+        """Счётчики ответов считают всех потомков"""
+        root = self.reply('Корень')
+        child = self.reply('Ребёнок', root)
+        self.reply('Внук', child)
+        root.refresh_from_db()
+        child.refresh_from_db()
+        self.assertEqual([root.replies_count, child.replies_count], [2, 1])
+        child.delete()
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 0)
+
+    @override_settings(COMMENTS_MAX_DEPTH=1)
+    def test_depth_limit(self):
+        """Ответ глубже предела становится соседом родителя"""
+        root = self.reply('Корень')
+        child = self.reply('Ребёнок', root)
+        too_deep = self.reply('Слишком глубоко', child)
+        self.assertEqual(too_deep.depth, 1)
+        self.assertEqual(too_deep.parent, root)
+
+    @override_settings(NUM_COMMENTS=2)
+    def test_subtree_page(self):
+        """Поддерево комментария выбирается страницами по курсору"""
+        root = self.reply('Корень')
+        replies = [self.reply(f'Ответ {i}', root) for i in range(3)]
+        self.reply('Другая ветка')
+        url = reverse('posts:comments_more', kwargs={'post_id': self.post.id})
+        with self.assertNumQueries(2):
+            response = Client().get(url, {'root': root.id})
+        self.assertEqual(response.context['comments'], replies[:2])
+        response = Client().get(url, {
+            'root': root.id, 'cursor': response.context['next_cursor']})
+        self.assertEqual(response.context['comments'], replies[2:])
+        self.assertIsNone(response.context['next_cursor'])
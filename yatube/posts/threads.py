@@ -0,0 +1,54 @@
+import re
+import secrets
+import time
+
+# Путь комментария - сегменты предков и его собственный через '/'.
+# Сегменты одной длины из [0-9a-z], поэтому сортировка по пути
+# даёт ветку в порядке вывода, а поддерево - это диапазон путей.
+PATH_SEP = '/'
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+STAMP_DIGITS = 11
+RANDOM_DIGITS = 3
+SEGMENT_LENGTH = STAMP_DIGITS + RANDOM_DIGITS
+MAX_STAMP = len(DIGITS) ** STAMP_DIGITS - 1
+PATH_RE = re.compile(
+    r'^[0-9a-z]{%d}(/[0-9a-z]{%d})*$' % (SEGMENT_LENGTH, SEGMENT_LENGTH))
+
+
+def to_base36(number, width):
+    chars = []
+    for _ in range(width):
+        number, rest = divmod(number, len(DIGITS))
+        chars.append(DIGITS[rest])
+    return ''.join(reversed(chars))
+
+
+def path_segment(root, stamp=None):
+    """
+    Сегмент пути: время в микросекундах и случайный хвост.
+    У корневых комментариев время инвертировано, чтобы новые ветки
+    шли первыми, а ответы внутри ветки - по порядку.
+    """
+    if stamp is None:
+        stamp = time.time_ns() // 1000
+    if root:
+        stamp = MAX_STAMP - stamp
+    return (to_base36(stamp, STAMP_DIGITS)
+            + to_base36(secrets.randbelow(len(DIGITS) ** RANDOM_DIGITS),
+                        RANDOM_DIGITS))
+
+
+def is_valid_path(path):
+    return bool(PATH_RE.match(path))
+
+
+def subtree_range(path):
+    """Границы (не включая) путей всех потомков комментария."""
+    # '/' идёт в ASCII прямо перед '0', так что потомки лежат между ними.
+    return path + PATH_SEP, path + '0'
+
+
+def ancestor_paths(path):
+    """Пути всех предков комментария, от корня."""
+    parts = path.split(PATH_SEP)
+    return [PATH_SEP.join(parts[:i]) for i in range(1, len(parts))]
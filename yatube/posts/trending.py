@@ -0,0 +1,93 @@
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .models import ActivityCounter, Group, Post
+
+POST = 'post'
+GROUP = 'group'
+# Окна для рейтингов: название и длина в секундах.
+WINDOWS = {'hour': 60 * 60, 'day': 24 * 60 * 60}
+TRENDING_KEY = 'trending:{}:{}'
+
+
+def current_bucket(now=None):
+    return int((now or time.time()) // settings.TRENDING_BUCKET)
+
+
+def record(kind, counts, now=None):
+    """Прибавляет события {id объекта: число} к текущему интервалу."""
+    bucket = current_bucket(now)
+    for object_id, count in counts.items():
+        rows = ActivityCounter.objects.filter(
+            kind=kind, bucket=bucket, object_id=object_id)
+        if rows.update(count=F('count') + count):
+            continue
+        try:
+            with transaction.atomic():
+                ActivityCounter.objects.create(
+                    kind=kind, bucket=bucket, object_id=object_id,
+                    count=count)
+        except IntegrityError:
+            rows.update(count=F('count') + count)
+
+
+def record_comments(posts):
+    """
+    Учитывает комментарии к записям: posts - список пар
+    (id записи, id группы или None), по паре на комментарий.
+    """
+    record(POST, Counter(post_id for post_id, _ in posts))
+    groups = Counter(group_id for _, group_id in posts if group_id)
+    if groups:
+        record(GROUP, groups)
+
+
+def record_post(post):
+    if post.group_id:
+        record(GROUP, {post.group_id: 1})
+
+
+def top(kind, window, limit, now=None):
+    """Самые активные объекты за окно: список пар (id, число событий)."""
+    first = current_bucket(now) - WINDOWS[window] // settings.TRENDING_BUCKET
+    return list(ActivityCounter.objects.filter(
+        kind=kind, bucket__gt=first).values('object_id').annotate(
+        total=Sum('count')).order_by('-total', '-object_id').values_list(
+        'object_id', 'total')[:limit])
+
+
+def build(now=None):
+    """
+    Пересчитывает рейтинги для всех окон, кладёт их в кэш готовыми
+    к выводу и удаляет интервалы старше самого длинного окна.
+    """
+    limit = settings.TRENDING_SIZE
+    for window in WINDOWS:
+        posts = top(POST, window, limit, now)
+        found = Post.objects.for_list().select_related('author').in_bulk(
+            [pk for pk, _ in posts])
+        cache.set(TRENDING_KEY.format(POST, window), [
+            {'id': pk, 'text': found[pk].excerpt[:80],
+             'author': found[pk].author.username, 'score': score}
+            for pk, score in posts if pk in found
+        ], settings.TRENDING_TIMEOUT)
+        groups = top(GROUP, window, limit, now)
+        found = Group.objects.in_bulk([pk for pk, _ in groups])
+        cache.set(TRENDING_KEY.format(GROUP, window), [
+            {'slug': found[pk].slug, 'title': found[pk].title,
+             'score': score}
+            for pk, score in groups if pk in found
+        ], settings.TRENDING_TIMEOUT)
+    oldest = current_bucket(now) - max(
+        WINDOWS.values()) // settings.TRENDING_BUCKET
+    ActivityCounter.objects.filter(bucket__lte=oldest).delete()
+
+
+def get_trending(kind, window):
+    """Готовый рейтинг из кэша, без запросов к БД."""
+    return cache.get(TRENDING_KEY.format(kind, window), [])
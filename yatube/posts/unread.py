@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import graph
+from .models import FeedMark, GroupSubscription
+
+# Число новых записей в ленте подписок пользователя и версия счётчика.
+UNREAD_KEY = 'feed:unread:{}:{}'
+UNREAD_VERSION_KEY = 'feed:unread:version:{}'
+# Сколько отметок обновлять одним запросом.
+UPDATE_CHUNK_SIZE = 500
+
+
+def post_published(post):
+    """
+    Прибавляет новую запись к счётчикам подписчиков автора и группы.
+    Счётчик есть только у тех, кто уже открывал ленту.
+    """
+    readers = set(graph.followers(post.author_id))
+    if post.group_id:
+        readers.update(GroupSubscription.objects.filter(
+            group_id=post.group_id).values_list('user_id', flat=True))
+    readers.discard(post.author_id)
+    if not readers:
+        return
+    readers = sorted(readers)
+    for start in range(0, len(readers), UPDATE_CHUNK_SIZE):
+        FeedMark.objects.filter(
+            user_id__in=readers[start:start + UPDATE_CHUNK_SIZE]).update(
+            unread=F('unread') + 1)
+    transaction.on_commit(lambda: graph.bump_versions(
+        [UNREAD_VERSION_KEY.format(user_id) for user_id in readers]))
+
+
+def unread_count(user):
+    """Число новых записей в ленте, из кэша."""
+    if not user.is_authenticated:
+        return 0
+    # Если запись вышла между чтением и записью в кэш, версия уже другая
+    # и устаревшее значение никто не прочитает.
+    key = UNREAD_KEY.format(
+        user.id, graph.cache_version(UNREAD_VERSION_KEY.format(user.id)))
+    count = cache.get(key)
+    if count is None:
+        count = FeedMark.objects.filter(user_id=user.id).values_list(
+            'unread', flat=True).first() or 0
+        if not connection.in_atomic_block:
+            cache.set(key, count, settings.FEED_UNREAD_TIMEOUT)
+    return count
+
+
+def mark_seen(user):
+    """
+    Обнуляет счётчик при просмотре ленты. Возвращает время прошлого
+    просмотра, None - если пользователь открыл ленту впервые.
+    """
+    now = timezone.now()
+    seen = FeedMark.objects.filter(user_id=user.id).values_list(
+        'seen', flat=True).first()
+    if seen is None:
+        FeedMark.objects.bulk_create(
+            [FeedMark(user_id=user.id, seen=now)], ignore_conflicts=True)
+    else:
+        FeedMark.objects.filter(user_id=user.id).update(seen=now, unread=0)
+    transaction.on_commit(lambda: graph.bump_versions(
+        [UNREAD_VERSION_KEY.format(user.id)]))
+    return seen
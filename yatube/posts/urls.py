@@ -5,16 +5,34 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('groups/', views.groups_index, name='groups_index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path('group/<slug:slug>/subscribe/', views.group_subscribe,
+         name='group_subscribe'),
+    path('group/<slug:slug>/unsubscribe/', views.group_unsubscribe,
+         name='group_unsubscribe'),
+    path('tag/<str:name>/', views.tag_posts, name='tag_posts'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/', views.comments_more,
+         name='comments_more'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('notifications/', views.notification_inbox,
+         name='notifications'),
     path('profile/<str:username>/follow/', views.profile_follow,
          name='profile_follow'),
     path('profile/<str:username>/unfollow/', views.profile_unfollow,
          name='profile_unfollow'),
+    path('profile/<str:username>/mute/', views.profile_mute,
+         name='profile_mute'),
+    path('profile/<str:username>/unmute/', views.profile_unmute,
+         name='profile_unmute'),
+    path('profile/<str:username>/followers/', views.profile_followers,
+         name='profile_followers'),
+    path('profile/<str:username>/following/', views.profile_following,
+         name='profile_following'),
 ]
@@ -1,9 +1,191 @@
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import connection
+from django.utils import timezone
 
+from . import graph
+from .markup import EXCERPT_LENGTH
+from .models import Comment, Follow, FollowSuggestion, User
+from .threads import is_valid_path, subtree_range
 
-def get_page_context(queryset, request):
+# Самое большое целое, которое SQLite хранит в столбце INTEGER.
+MAX_INTEGER = 2 ** 63 - 1
+LATEST_COMMENTS_SQL = '''
+    SELECT c.id, c.post_id, c.excerpt, c.created, c.total,
+           u.id, u.username, u.first_name, u.last_name
+    FROM (
+        SELECT id, post_id, author_id, created,
+               CASE WHEN excerpt = '' THEN substr(text, 1, %s)
+                    ELSE excerpt END AS excerpt,
+               ROW_NUMBER() OVER (
+                   PARTITION BY post_id ORDER BY created DESC, id DESC
+               ) AS num,
+               COUNT(*) OVER (PARTITION BY post_id) AS total
+        FROM {comments}
+        WHERE post_id IN ({ids})
+    ) AS c
+    JOIN {users} AS u ON u.id = c.author_id
+    WHERE c.num <= %s
+    ORDER BY c.post_id, c.num
+'''
+
+
+def get_page_context(queryset, request, cache_key=None, hide_muted=False):
+    """
+    Страница постов. С cache_key окно страницы общее для всех читателей
+    и кэшируется. С hide_muted посты скрытых читателем авторов
+    отбрасываются уже после выборки, а окно берётся с запасом
+    MUTE_OVERFETCH постов, чтобы страница осталась полной; на стыке
+    страниц такой читатель может увидеть пост дважды.
+    """
+    muted = graph.muted(request.user.id) if hide_muted else ()
     paginator = Paginator(queryset, settings.NUM_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page = request.GET.get('page', '')
+    key = f'{cache_key}:{page if page.isdigit() else 1}'
+    window = cache.get(key) if cache_key else None
+    if window is None:
+        number = paginator.get_page(page).number
+        offset = (number - 1) * paginator.per_page
+        overfetch = settings.MUTE_OVERFETCH if cache_key or muted else 0
+        posts = list(queryset[offset:offset + paginator.per_page + overfetch])
+        attach_latest_comments(posts)
+        window = (paginator.count, number, posts)
+        if cache_key:
+            cache.set(key, window, settings.INDEX_CACHE_TIMEOUT)
+    count, number, posts = window
+    # Число постов уже известно, повторный COUNT не нужен.
+    paginator.count = count
+    if muted:
+        posts = without_muted(posts, muted)
+        for post in posts:
+            post.latest_comments = without_muted(post.latest_comments, muted)
+    page_obj = Page(posts[:paginator.per_page], number, paginator)
+    attach_follow_state(page_obj.object_list, request.user)
     return {'page_obj': page_obj}
+
+
+def without_muted(items, muted):
+    """Убирает посты или комментарии скрытых авторов."""
+    if not muted:
+        return items
+    return [item for item in items
+            if not graph.contains(muted, item.author_id)]
+
+
+def attach_follow_state(posts, user):
+    """Отмечает карточки авторов, на которых подписан пользователь."""
+    following = graph.following(user.id) if user.is_authenticated else ()
+    for post in posts:
+        post.author_followed = graph.contains(following, post.author_id)
+
+
+def parse_id(value):
+    """Id или курсор из параметра запроса, None для неверного значения."""
+    if value.isdecimal() and int(value) <= MAX_INTEGER:
+        return int(value)
+    return None
+
+
+def get_follow_list_context(request, field, lookup):
+    """
+    Страница подписчиков или подписок: курсор - id последнего
+    показанного пользователя, выборка идёт диапазоном по индексу
+    (author, user) или (user, author) вместе с именами. Подписан ли
+    читатель на каждого из них, берётся из графа подписок.
+    """
+    column = field + '_id'
+    follows = Follow.objects.filter(**lookup).select_related(
+        field).order_by(column)
+    cursor = request.GET.get('cursor', '')
+    if cursor:
+        if parse_id(cursor) is None:
+            raise ValueError('Неверный курсор')
+        follows = follows.filter(**{column + '__gt': parse_id(cursor)})
+    users = [getattr(follow, field)
+             for follow in follows[:settings.NUM_FOLLOWS + 1]]
+    next_cursor = None
+    if len(users) > settings.NUM_FOLLOWS:
+        users = users[:settings.NUM_FOLLOWS]
+        next_cursor = users[-1].id
+    following = (graph.following(request.user.id)
+                 if request.user.is_authenticated else ())
+    for user in users:
+        user.followed = graph.contains(following, user.id)
+    return {'users': users, 'next_cursor': next_cursor}
+
+
+def get_suggestions(user, exclude=None):
+    """
+    Рекомендованные пользователю авторы одним запросом по индексу.
+    Авторы, на которых он успел подписаться после расчёта, отбрасываются.
+    """
+    if not user.is_authenticated:
+        return []
+    following = graph.following(user.id)
+    suggestions = FollowSuggestion.objects.filter(
+        user=user).select_related('author')[:settings.SUGGESTIONS_TOP_K]
+    authors = [
+        suggestion.author for suggestion in suggestions
+        if not graph.contains(following, suggestion.author_id)
+        and suggestion.author_id != exclude
+    ]
+    return authors[:settings.NUM_SUGGESTIONS]
+
+
+def attach_latest_comments(posts, count=None):
+    """
+    Добавляет карточкам последние комментарии (latest_comments) и их
+    общее число (comments_total) одним запросом с оконной функцией.
+    У комментариев загружается только выдержка excerpt.
+    """
+    count = count or settings.NUM_LATEST_COMMENTS
+    by_id = {}
+    for post in posts:
+        post.latest_comments = []
+        post.comments_total = 0
+        by_id[post.id] = post
+    if not by_id:
+        return
+    sql = LATEST_COMMENTS_SQL.format(
+        comments=Comment._meta.db_table,
+        users=User._meta.db_table,
+        ids=', '.join(['%s'] * len(by_id)))
+    created_field = Comment._meta.get_field('created')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [EXCERPT_LENGTH, *by_id, count])
+        for (pk, post_id, excerpt, created, total,
+             author_id, username, first_name, last_name) in cursor:
+            created = created_field.to_python(created)
+            if settings.USE_TZ and timezone.is_naive(created):
+                created = timezone.make_aware(created, timezone.utc)
+            comment = Comment(id=pk, post_id=post_id, excerpt=excerpt,
+                              created=created, author_id=author_id)
+            comment.author = User(id=author_id, username=username,
+                                  first_name=first_name, last_name=last_name)
+            post = by_id[post_id]
+            post.latest_comments.append(comment)
+            post.comments_total = total
+
+
+def get_comments_context(comments, cursor=None, root=None):
+    """
+    Страница ветки комментариев в порядке вывода: новые ветки первыми,
+    ответы под своим комментарием. Выбирается одним диапазоном по пути,
+    курсор - путь последнего показанного комментария. С root - только
+    поддерево этого комментария.
+    """
+    comments = comments.select_related('author').order_by('path')
+    if root is not None:
+        low, high = subtree_range(root.path)
+        comments = comments.filter(path__gt=low, path__lt=high)
+    if cursor:
+        if not is_valid_path(cursor):
+            raise ValueError('Неверный курсор')
+        comments = comments.filter(path__gt=cursor)
+    comments = list(comments[:settings.NUM_COMMENTS + 1])
+    next_cursor = None
+    if len(comments) > settings.NUM_COMMENTS:
+        comments = comments[:settings.NUM_COMMENTS]
+        next_cursor = comments[-1].path
+    return {'comments': comments, 'next_cursor': next_cursor}
@@ -1,61 +1,166 @@
+from django.conf import settings
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
-from .models import Post, Group, User, Follow
+from .models import Post, Group, User, Follow, Comment, Mute
+from .models import GroupSubscription, RelatedPost, Tag
+from django.core.paginator import Paginator
+from django.db.models import F
 from .forms import PostForm, CommentForm
 from django.contrib.auth.decorators import login_required
-from .utils import get_page_context
-from django.views.decorators.cache import cache_page
+from .utils import get_page_context, get_comments_context, get_suggestions
+from .utils import get_follow_list_context, parse_id, without_muted
+from .queues import enqueue_comment, get_pending_comments
+from . import graph, notifications, trending, unread
+from .counters import view_counter, views_of
+from .feeds import MergedFeed
 
 
-@cache_page(20, key_prefix="index_page")
 def index(request):
     """Выводит шаблон главной страницы"""
-    context = get_page_context(Post.objects.all(), request)
+    # Окно страницы кэшируется общим, скрытые авторы убираются после.
+    context = get_page_context(
+        Post.objects.for_list().select_related('author', 'group'), request,
+        cache_key='index_page', hide_muted=True)
+    context['trending_posts'] = (
+        trending.get_trending(trending.POST, 'hour')
+        or trending.get_trending(trending.POST, 'day'))
+    context['trending_groups'] = (
+        trending.get_trending(trending.GROUP, 'hour')
+        or trending.get_trending(trending.GROUP, 'day'))
     return render(request, 'posts/index.html', context)
 
 
+GROUP_SORTS = {
+    'activity': F('stats__last_post_date').desc(nulls_last=True),
+    'posts': F('stats__posts_count').desc(nulls_last=True),
+    'authors': F('stats__authors_count').desc(nulls_last=True),
+}
+
+
+def groups_index(request):
+    """Каталог групп со сводкой из GroupStats одним запросом"""
+    sort = request.GET.get('sort')
+    if sort not in GROUP_SORTS:
+        sort = 'activity'
+    groups = Group.objects.select_related('stats').order_by(
+        GROUP_SORTS[sort], 'title')
+    page_obj = Paginator(groups, settings.NUM_GROUPS).get_page(
+        request.GET.get('page'))
+    return render(request, 'posts/groups.html', {
+        'page_obj': page_obj, 'sort': sort})
+
+
 def group_posts(request, slug):
     """Выводит шаблон с группами постов"""
     group = get_object_or_404(Group, slug=slug)
     context = {
         'group': group,
+        'subscribed': request.user.is_authenticated and (
+            request.user.group_subscriptions.filter(group=group).exists()),
     }
     context.update(get_page_context(
-        Post.objects.all().filter(group=group), request))
+        group.posts.for_list().select_related('author'), request,
+        hide_muted=True))
     return render(request, 'posts/group_list.html', context)
 
 
+def tag_posts(request, name):
+    """Лента тега по индексу (tag, -pub_date)"""
+    tag = get_object_or_404(Tag, name=name.lower())
+    posts = Post.objects.for_list().filter(
+        tag_links__tag=tag).select_related('author', 'group').order_by(
+        '-tag_links__pub_date')
+    context = {'tag': tag}
+    context.update(get_page_context(posts, request, hide_muted=True))
+    return render(request, 'posts/tag_posts.html', context)
+
+
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    following = (request.user.is_authenticated) and (
-        Follow.objects.filter(user=request.user, author=author).exists())
     context = {
-        'following': following,
+        'following': graph.is_following(request.user.id, author.id),
+        'muted': graph.contains(graph.muted(request.user.id), author.id),
+        'followers_count': graph.followers_count(author.id),
+        'following_count': graph.following_count(author.id),
         'author': author,
+        'suggestions': get_suggestions(request.user, exclude=author.id),
     }
-    context.update(get_page_context(author.posts.all(), request))
+    context.update(get_page_context(
+        author.posts.for_list().select_related('group'), request))
     return render(request, 'posts/profile.html', context)
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id)
     form = CommentForm()
+    view_counter.hit(post.id)
     context = {
         'post': post,
         'form': form,
+        'views': views_of(post),
     }
+    context.update(get_comments_context(post.comments.all()))
+    muted = graph.muted(request.user.id)
+    context['comments'] = (get_pending_comments(request, post)
+                           + without_muted(context['comments'], muted))
+    # Похожие записи посчитаны заранее, здесь один запрос по индексу.
+    related = RelatedPost.objects.filter(post=post).select_related(
+        'related__author').defer(
+        'related__text', 'related__text_html')[:settings.RELATED_TOP_K]
+    context['related_posts'] = without_muted(
+        [link.related for link in related], muted)[:settings.NUM_RELATED]
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_more(request, post_id):
+    """
+    Следующая страница комментариев поста фрагментом HTML.
+    С параметром root - страница ветки ответов на комментарий.
+    """
+    root = None
+    if request.GET.get('root'):
+        root_id = parse_id(request.GET['root'])
+        if root_id is None:
+            raise Http404('Неверная ветка')
+        root = get_object_or_404(Comment, id=root_id, post_id=post_id)
+    try:
+        context = get_comments_context(
+            Comment.objects.filter(post_id=post_id),
+            request.GET.get('cursor'), root)
+    except ValueError:
+        raise Http404('Неверный курсор')
+    context['comments'] = without_muted(
+        context['comments'], graph.muted(request.user.id))
+    context['post_id'] = post_id
+    context['root'] = root
+    return render(request, 'includes/comment_list.html', context)
+
+
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
+    parent_id = parse_id(request.POST.get('parent', ''))
+    if settings.COMMENT_BATCH_SIZE > 1:
+        # Пост и родитель проверяются при записи пачки из очереди.
+        if form.is_valid():
+            enqueue_comment(
+                request, post_id, form.cleaned_data['text'], parent_id)
+            notifications.comment_added(post_id, request.user.id)
+        return redirect('posts:post_detail', post_id=post_id)
+    post = get_object_or_404(Post, id=post_id)
+    parent = None
+    if parent_id is not None:
+        parent = get_object_or_404(Comment, id=parent_id, post=post)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        comment.place(parent)
         comment.save()
+        trending.record_comments([(post.id, post.group_id)])
+        notifications.comment_added(post.id, request.user.id)
     return redirect('posts:post_detail', post_id=post_id)
 
 
@@ -69,6 +174,7 @@ def post_create(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    trending.record_post(post)
     return redirect("posts:profile", request.user)
 
 
@@ -91,9 +197,21 @@ def post_edit(request, post_id):
 
 @login_required
 def follow_index(request):
-    # информация о текущем пользователе доступна в переменной request.user
-    context = get_page_context(Post.objects.filter(
-        author__following__user=request.user), request)
+    # Подписки на авторов и на группы сливаются без OR-запроса.
+    feed = MergedFeed(
+        Post.objects.for_list().select_related('author', 'group'),
+        author_id=graph.following(request.user.id),
+        group_id=request.user.group_subscriptions.values_list(
+            'group_id', flat=True))
+    context = get_page_context(feed, request)
+    if context['page_obj'].number == 1:
+        # Записи новее прошлого просмотра выделяются в ленте, свои -
+        # нет, как и в счётчике новых записей.
+        seen = unread.mark_seen(request.user)
+        for post in context['page_obj']:
+            post.is_new = (seen is not None and post.pub_date > seen
+                           and post.author_id != request.user.id)
+    context['suggestions'] = get_suggestions(request.user)
     return render(request, 'posts/follow.html', context)
 
 
@@ -101,10 +219,9 @@ def follow_index(request):
 def profile_follow(request, username):
     # Подписаться на автора
     user = request.user
-    author = User.objects.get(username=username)
-    if_follower = Follow.objects.filter(user=user, author=author)
-    if user != author and not if_follower.exists():
-        Follow.objects.create(user=user, author=author)
+    author = get_object_or_404(User, username=username)
+    if user != author and graph.follow(user.id, author.id):
+        notifications.followed(author.id, user.id)
     return redirect(reverse('posts:profile', args=[username]))
 
 
@@ -112,7 +229,67 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     # Дизлайк, отписка
     author = get_object_or_404(User, username=username)
-    is_follower = Follow.objects.filter(user=request.user, author=author)
-    if is_follower.exists():
-        is_follower.delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=author)
+
+
+@login_required
+def group_subscribe(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    GroupSubscription.objects.get_or_create(user=request.user, group=group)
+    return redirect('posts:group_list', slug=slug)
+
+
+@login_required
+def group_unsubscribe(request, slug):
+    GroupSubscription.objects.filter(
+        user=request.user, group__slug=slug).delete()
+    return redirect('posts:group_list', slug=slug)
+
+
+@login_required
+def profile_mute(request, username):
+    # Скрыть автора из лент и комментариев
+    author = get_object_or_404(User, username=username)
+    if author != request.user:
+        Mute.objects.get_or_create(user=request.user, author=author)
+    return redirect('posts:profile', username=username)
+
+
+@login_required
+def profile_unmute(request, username):
+    author = get_object_or_404(User, username=username)
+    Mute.objects.filter(user=request.user, author=author).delete()
+    return redirect('posts:profile', username=username)
+
+
+def profile_followers(request, username):
+    author = get_object_or_404(User, username=username)
+    return follow_list(request, author, 'Подписчики', 'user',
+                       {'author': author})
+
+
+def profile_following(request, username):
+    author = get_object_or_404(User, username=username)
+    return follow_list(request, author, 'Подписки', 'author',
+                       {'user': author})
+
+
+def follow_list(request, author, title, field, lookup):
+    try:
+        context = get_follow_list_context(request, field, lookup)
+    except ValueError:
+        raise Http404('Неверный курсор')
+    context.update({'author': author, 'title': title})
+    return render(request, 'posts/follow_list.html', context)
+
+
+@login_required
+def notification_inbox(request):
+    """Ящик уведомлений, первая страница отмечает их прочитанными"""
+    try:
+        context = notifications.get_inbox_context(
+            request.user, request.GET.get('cursor'))
+    except ValueError:
+        raise Http404('Неверный курсор')
+    return render(request, 'posts/notifications.html', context)
@@ -6,6 +6,17 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 NUM_POSTS = 10
+NUM_COMMENTS = 20
+NUM_LATEST_COMMENTS = 3
+# Глубже ответы становятся соседями родителя.
+COMMENTS_MAX_DEPTH = 5
+
+# Комментарии копятся в очереди на диске и пишутся в БД пачками
+# по COMMENT_BATCH_SIZE штук или раз в COMMENT_FLUSH_INTERVAL секунд.
+# При размере пачки 1 очередь не используется.
+SPOOL_ROOT = os.path.join(BASE_DIR, 'spool')
+COMMENT_BATCH_SIZE = int(os.environ.get('COMMENT_BATCH_SIZE', 1))
+COMMENT_FLUSH_INTERVAL = 2
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -63,6 +74,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'posts.context_processors.feed.unread',
+                'posts.context_processors.notifications.unread',
             ],
         },
     },
@@ -120,12 +133,84 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Отдача медиа: без заголовка файлы стримятся через wsgi.file_wrapper,
+# с заголовком (X-Accel-Redirect, X-Sendfile) их отдаёт фронтовой сервер.
+MEDIA_OFFLOAD_HEADER = os.environ.get('MEDIA_OFFLOAD_HEADER', '')
+MEDIA_OFFLOAD_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 60 * 60
+MEDIA_BLOCK_SIZE = 64 * 1024
+# Сколько секунд после загрузки (в том числе повторной) файл картинки
+# не удаляется, даже если ссылок на него ещё нет.
+MEDIA_REUSE_GRACE = 60
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+FOLLOW_GRAPH_TIMEOUT = 24 * 60 * 60
+
+# Сколько рекомендаций хранить и сколько показывать.
+SUGGESTIONS_TOP_K = 20
+NUM_SUGGESTIONS = 5
+NUM_FOLLOWS = 50
+NUM_GROUPS = 50
+
+# Общее для всех читателей окно главной страницы.
+INDEX_CACHE_TIMEOUT = 20
+# Запас постов в окне страницы на случай скрытых авторов.
+MUTE_OVERFETCH = 5
+
+# Рейтинги активности: длина интервала счётчиков в секундах,
+# размер рейтинга и срок жизни посчитанного рейтинга в кэше.
+TRENDING_BUCKET = 5 * 60
+TRENDING_SIZE = 5
+TRENDING_TIMEOUT = 60 * 60
+
+# Просмотры постов: процесс переносит их в кэш каждые VIEW_PUSH_SIZE
+# просмотров или VIEW_PUSH_INTERVAL секунд, в БД они попадают не чаще
+# раза в VIEW_FLUSH_INTERVAL секунд, с отставанием на один сброс.
+# Команда flush_views дописывает и последнее поколение, подождав
+# VIEW_FLUSH_GRACE секунд. Несброшенные просмотры живут в кэше
+# VIEW_CACHE_TIMEOUT секунд.
+VIEW_PUSH_SIZE = 20
+VIEW_PUSH_INTERVAL = 5
+VIEW_FLUSH_INTERVAL = 60
+VIEW_FLUSH_GRACE = 1
+VIEW_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Сколько хранить в кэше счётчик новых записей ленты подписок.
+FEED_UNREAD_TIMEOUT = 24 * 60 * 60
+
+# Уведомления пишутся пачками по NOTIFY_BATCH_SIZE событий или раз
+# в NOTIFY_FLUSH_INTERVAL секунд. При размере пачки 1 очередь
+# не используется.
+NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', 1))
+NOTIFY_FLUSH_INTERVAL = 10
+NOTIFY_UNREAD_TIMEOUT = 24 * 60 * 60
+NUM_NOTIFICATIONS = 20
+
+# Почти одинаковые записи: тексты короче DUPLICATE_MIN_WORDS слов не
+# проверяются, похожей считается запись, совпавшая хотя бы в
+# DUPLICATE_MIN_BANDS из 16 полос подписи (примерно от 70% общих пар слов).
+DUPLICATE_MIN_WORDS = 8
+DUPLICATE_MIN_BANDS = 4
+
+# Похожие записи: сколько хранить на запись, сколько показывать
+# и с какой косинусной близости запись считается похожей.
+RELATED_TOP_K = 10
+NUM_RELATED = 5
+RELATED_MIN_SCORE = 0.1
+
+# Сжатие длинных текстов записей и их HTML zlib, включается переменной
+# окружения POST_TEXT_COMPRESSION=1. Тексты короче
+# POST_TEXT_COMPRESS_MIN_SIZE байт и плохо сжимаемые хранятся как есть.
+# Уже сохранённые записи переписывает команда compress_texts.
+POST_TEXT_COMPRESSION = os.environ.get('POST_TEXT_COMPRESSION') == '1'
+POST_TEXT_COMPRESS_MIN_SIZE = 1024
+POST_TEXT_COMPRESS_LEVEL = 6
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.views import serve_media
 
 
 urlpatterns = [
@@ -10,17 +11,14 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path(settings.MEDIA_URL.lstrip('/') + '<path:path>', serve_media,
+         name='media'),
 ]
 
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
 handler403 = 'core.views.permission_denied'
 
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
-
 if settings.DEBUG:
     import debug_toolbar
 